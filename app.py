@@ -1,42 +1,121 @@
-from flask import Flask, render_template
-from flask_socketio import SocketIO, emit
-import threading
-import traceback # NEW: For printing exact error lines
+from flask import Flask, Response, render_template, jsonify, request
+from flask_socketio import SocketIO, emit, join_room
+import os
+import queue
 
 from src.classify_playlist import get_user_playlists, classify_and_create
+from src.jobs import JobManager
+from src.sort_state import get_sort_state, PlaylistWatcher
+from src import model_registry, metrics
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+DEBUG = True
+TRACK_TIMINGS = True   # Include a per-stage timing breakdown with every track sent to the page
+# Fold newly classified tracks into the model after each job (see run_training.update_model).
+# The registry notices the swapped model file and uses it for the next job.
+AUTO_UPDATE_MODEL = os.environ.get('AUTO_UPDATE_MODEL') == '1'
+
+def run_job(job):
+    print(f"\n[JOB {job.id}] Sorting playlist {job.playlist_id}...")
+    classify_and_create(job.playlist_id, job.add_repeats, job.progress, parallel=True,
+                        should_stop=job.cancelled, track_timings=TRACK_TIMINGS, full=job.full)
+    print(f"[JOB {job.id}] Finished ({job.processed} tracks).")
+    if AUTO_UPDATE_MODEL and not job.cancelled():
+        # The sort itself succeeded; a failed update mustn't mark the job failed
+        try:
+            from src.run_training import update_model
+            update_model(n_jobs=1)
+        except Exception as e:
+            print(f"[JOB {job.id}] Model update failed: {e}")
+
+# Progress only goes to the clients following a job, i.e. in its room
+jobs = JobManager(run_job, lambda event, payload, job_id: socketio.emit(event, payload, to=job_id))
+# Watched playlists are polled by snapshot_id; a change queues a job that sorts only the new tracks
+watcher = PlaylistWatcher(lambda playlist_id, add_repeats: jobs.submit(playlist_id, add_repeats))
+
 @app.route('/')
 def index():
-    return render_template('index.html', playlists=get_user_playlists())
+    return render_template('index.html', playlists=get_user_playlists(), models=model_registry.status())
+
+@app.route('/status')
+def models_status():
+    return jsonify(model_registry.status())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(jobs.list())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    return jsonify({'cancelled': jobs.cancel(job_id)})
+
+@app.route('/watch')
+def list_watched():
+    return jsonify(get_sort_state().watched)
+
+@app.route('/watch/<playlist_id>', methods=['POST'])
+def watch_playlist(playlist_id):
+    get_sort_state().watch(playlist_id, bool((request.get_json(silent=True) or {}).get('add_repeats')))
+    return jsonify(get_sort_state().watched)
+
+@app.route('/watch/<playlist_id>', methods=['DELETE'])
+def unwatch_playlist(playlist_id):
+    return jsonify({'removed': get_sort_state().unwatch(playlist_id)})
+
+@socketio.on('connect')
+def handle_connect():
+    # Newly opened pages get the current model state right away
+    emit('model_status', model_registry.status())
 
 @socketio.on('start_classification')
 def handle_start(data):
     print(f"\n[SERVER] Received request to sort playlist: {data['playlist_id']}")
-    
-    def progress(artist, name, tid, label, conf):
-        socketio.emit('update', {
-            'song': f"{artist} - {name}", 
-            'label': label,
-            'confidence': f"{conf*100:.1f}%"
-        })
-
-    # Wrapper function to catch and print thread errors
-    def run_worker():
-        try:
-            print("[THREAD] Starting worker...")
-            classify_and_create(data['playlist_id'], data['add_repeats'], progress)
-            print("[THREAD] Worker finished successfully.")
-        except Exception as e:
-            print(f"\n❌ [CRITICAL THREAD ERROR]: {e}")
-            traceback.print_exc() # Prints the exact line that failed
-            socketio.emit('status', {'msg': f"Error: {str(e)}"}) # Send error to UI
+    try:
+        job, created = jobs.submit(data['playlist_id'], data.get('add_repeats', False), data.get('full', False))
+    except queue.Full:
+        emit('status', {'msg': "Too many sorting jobs queued, try again later."})
+        return
+
+    if not created:
+        print(f"[SERVER] Playlist already being sorted by job {job.id}, following it instead.")
+    join_room(job.id, sid=request.sid)
+    emit('job_started', {**job.to_dict(), 'existing': not created})
+    # The job's first status went out before we joined its room (and it may
+    # already have started); send the current one, now that every later
+    # change reaches this client
+    emit('job_status', job.to_dict())
+    if data.get('watch'):
+        get_sort_state().watch(data['playlist_id'], data.get('add_repeats', False))
+
+@socketio.on('cancel_job')
+def handle_cancel(data):
+    jobs.cancel(data['job_id'])
 
-    t = threading.Thread(target=run_worker)
-    t.daemon = True # Ensures thread dies if you close the Flask app
-    t.start()
+def is_serving_process():
+    """
+    With debug on, the Werkzeug reloader runs __main__ twice: in a parent
+    that only watches files and in the child that serves requests (which
+    has WERKZEUG_RUN_MAIN=true). Background work belongs in the child only.
+    """
+    return not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True)
\ No newline at end of file
+    if is_serving_process():
+        # Load torch/transformers/AST and the classifier in the background so the page is up immediately
+        model_registry.warm_up(on_status=lambda st: socketio.emit('model_status', st))
+        # A second watcher would queue every change twice
+        watcher.start()
+    socketio.run(app, debug=DEBUG)
\ No newline at end of file
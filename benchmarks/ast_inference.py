@@ -0,0 +1,97 @@
+# Run from the project root: python -m benchmarks.ast_inference [audio files...] --mode int8
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.model_registry import get_ast_model, get_classifier
+from src.feature_extraction import (
+    extract_ast_features_batch, extract_librosa_features,
+    AST_SAMPLE_RATE, LIBROSA_SAMPLE_RATE, AST_DURATION, AST_BATCH_SIZE
+)
+
+
+def load_clips(files, count, seed=0):
+    """Decodes the given files, or makes `count` synthetic clips if none were given."""
+    import librosa
+    clips = []
+    if files:
+        for path in files:
+            y, _ = librosa.load(path, sr=LIBROSA_SAMPLE_RATE, mono=True, duration=AST_DURATION)
+            clips.append(y)
+        return clips
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(30 * LIBROSA_SAMPLE_RATE)) / LIBROSA_SAMPLE_RATE
+    for _ in range(count):
+        freq = rng.uniform(80, 2000)
+        y = 0.3 * np.sin(2 * np.pi * freq * t) + 0.05 * rng.standard_normal(t.size)
+        clips.append(y.astype(np.float32))
+    return clips
+
+
+def timed_probs(clips, mode, compile_mode, batch_size):
+    get_ast_model(mode, compile_mode)   # Load outside the timed section
+    extract_ast_features_batch(clips[:1], mode=mode, compile_mode=compile_mode)   # Warm-up
+    start = time.perf_counter()
+    probs = extract_ast_features_batch(clips, batch_size=batch_size, mode=mode, compile_mode=compile_mode)
+    return probs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a fast AST inference mode against the fp32 baseline.")
+    parser.add_argument('files', nargs='*', help="Sample audio files (default: synthetic clips)")
+    parser.add_argument('--mode', default='int8', choices=['fp32', 'int8'])
+    parser.add_argument('--compile', default='none', choices=['none', 'compile', 'trace'])
+    parser.add_argument('--threads', type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument('--samples', type=int, default=16, help="Synthetic clips to use when no files are given")
+    parser.add_argument('--batch-size', type=int, default=AST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    import librosa
+    clips = load_clips(args.files, args.samples)
+    ast_clips = [librosa.resample(y, orig_sr=LIBROSA_SAMPLE_RATE, target_sr=AST_SAMPLE_RATE) for y in clips]
+
+    base, base_time = timed_probs(ast_clips, 'fp32', 'none', args.batch_size)
+    fast, fast_time = timed_probs(ast_clips, args.mode, args.compile, args.batch_size)
+
+    labels = list(base[0])
+    base_m = np.array([[p[k] for k in labels] for p in base])
+    fast_m = np.array([[p[k] for k in labels] for p in fast])
+    diff = np.abs(base_m - fast_m)
+    top5 = np.mean([
+        len(set(np.argsort(b)[-5:]) & set(np.argsort(f)[-5:])) / 5
+        for b, f in zip(base_m, fast_m)
+    ])
+
+    print(f"\n--- AST {args.mode} (compile={args.compile}) vs fp32 on {len(clips)} clips ---")
+    print(f"  fp32 time:            {base_time:.2f}s ({base_time / len(clips) * 1000:.0f} ms/clip)")
+    print(f"  {args.mode} time:{' ' * (18 - len(args.mode))}{fast_time:.2f}s ({fast_time / len(clips) * 1000:.0f} ms/clip)")
+    print(f"  speedup:              {base_time / fast_time:.2f}x")
+    print(f"  mean |prob diff|:     {diff.mean():.5f}")
+    print(f"  max |prob diff|:      {diff.max():.5f}")
+    print(f"  top-5 label overlap:  {top5 * 100:.1f}%")
+
+    # --- Downstream agreement: do both feature sets pick the same playlist? ---
+    try:
+        model = get_classifier()
+    except (OSError, FileNotFoundError):
+        print("  (no trained classifier found, skipping downstream agreement)")
+        return
+    lib = [extract_librosa_features(y, LIBROSA_SAMPLE_RATE) for y in clips]
+    columns = getattr(model, 'feature_names_in_', None)
+    frames = []
+    for probs in (base, fast):
+        frame = pd.DataFrame([{**l, **p} for l, p in zip(lib, probs)])
+        frames.append(frame.reindex(columns=columns) if columns is not None else frame)
+    agreement = np.mean(model.predict(frames[0]) == model.predict(frames[1]))
+    print(f"  classifier agreement: {agreement * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
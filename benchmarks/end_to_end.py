@@ -0,0 +1,326 @@
+# Run from the project root: python -m benchmarks.end_to_end --sizes 10 100 1000 10000
+#
+# Drives process_and_extract_features, train_model and classify_and_create
+# end to end without touching YouTube or Spotify: audio is synthesized
+# in-process instead of being resolved and streamed, and the Spotify client
+# talks to benchmarks/fake_spotify.py. Every size runs in its own process
+# (and its own temp directory for the stores, caches and models) so peak RSS
+# and the model/store singletons never carry over between sizes.
+#
+# Compare against a stored baseline to catch regressions:
+#   python -m benchmarks.end_to_end --save-baseline          # once, on a known-good tree
+#   python -m benchmarks.end_to_end --baseline benchmarks/baseline.json
+
+import os
+import sys
+import json
+import time
+import zlib
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+from benchmarks.fake_spotify import FakeSpotify, DEFAULT_LABELS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = [10, 100, 1000, 10000]
+RESULTS_PATH = os.path.join('benchmarks', 'results', 'end_to_end.json')
+BASELINE_PATH = os.path.join('benchmarks', 'baseline.json')
+TOLERANCE = 0.20             # Allowed slowdown before a metric counts as a regression
+TRACK_SECONDS = 200          # Length of every synthetic song
+MIN_TRAIN_ROWS = 200         # Small sizes still need a few rows per class for the stratified split
+FAKE_AST_LABELS = 32
+
+# (path into a size's result, True if higher is better) checked against the baseline
+COMPARED = [
+    (('classify', 'tracks_per_minute'), True),
+    (('extract', 'per_track', 'p50'), False),
+    (('train', 'seconds'), False),
+    (('peak_rss_mb',), False),
+]
+
+
+# --- Stand-ins ---
+def synthetic_audio(video_id, sample_rate, duration, offset=0.0):
+    """A reproducible song: a per-track tone and tempo, noise and amplitude beats."""
+    seed = zlib.crc32(video_id.encode('utf-8'))
+    rng = np.random.default_rng(seed)
+    t = offset + np.arange(int(duration * sample_rate)) / sample_rate
+    pitch = 110 * 2 ** ((seed % 36) / 12)
+    beats = (60 + seed % 120) / 60
+    y = 0.3 * np.sin(2 * np.pi * pitch * t) + 0.05 * rng.standard_normal(t.size)
+    y *= 0.5 + 0.5 * (np.sin(2 * np.pi * beats * t) > 0)
+    return y.astype(np.float32)
+
+
+def install_fakes(feature_extraction, metrics, download_latency=0.0, fake_ast=False):
+    """Swaps yt-dlp/ffmpeg (and optionally the AST) for local stand-ins."""
+
+    def resolve(query):
+        video_id = f"synthetic-{zlib.crc32(query.encode('utf-8')):08x}"
+        return {'id': video_id, 'url': f"synthetic://{video_id}", 'duration': TRACK_SECONDS, 'http_headers': {}}
+
+    def stream(info, sample_rate, duration=None, offset=None):
+        if download_latency:
+            time.sleep(download_latency)
+        return synthetic_audio(info['id'], sample_rate, duration or TRACK_SECONDS, offset or 0.0)
+
+    feature_extraction.resolve_stream = resolve
+    feature_extraction.stream_pcm = stream
+    feature_extraction.ACQUISITION_MODE = 'stream'
+
+    if fake_ast:
+        projection = np.random.default_rng(0).standard_normal((64, FAKE_AST_LABELS)).astype(np.float32)
+
+        def ast_batch(clips, sampling_rate=None, batch_size=None, mode=None, compile_mode=None):
+            # Log band energies through a fixed random projection: cheap, but
+            # still a deterministic function of the audio
+            results = []
+            with metrics.timed('ast_forward'):
+                for clip in clips:
+                    spectrum = np.abs(np.fft.rfft(clip[:1 << 16]))
+                    bands = np.log1p(np.array([b.mean() for b in np.array_split(spectrum, 64)], dtype=np.float32))
+                    probs = 1 / (1 + np.exp(-(bands - bands.mean()) @ projection / 8))
+                    results.append({f"fake_ast_{i}": float(p) for i, p in enumerate(probs)})
+            return results
+
+        feature_extraction.extract_ast_features_batch = ast_batch
+
+
+# --- Measurements ---
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'mean': float(values.mean()),
+    }
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def stage_totals(metrics):
+    histograms = metrics.REGISTRY.snapshot().get('stage_seconds', {})
+    return {dict(labels)['stage']: {'count': count, 'seconds': total} for labels, (count, total) in histograms.items()}
+
+
+def run_size(n, args):
+    """Runs every phase for one playlist size and returns its result dict."""
+    fake = FakeSpotify(rate_limit=args.rate_limit, latency=args.spotify_latency)
+    source_id = fake.make_library(n, labels=DEFAULT_LABELS)
+    os.environ['SPOTIFY_API_PREFIX'] = fake.start()
+    os.environ.setdefault('SPOTIFY_ACCESS_TOKEN', 'benchmark')
+
+    # Imported only now: the Spotify client reads its API prefix at import time
+    sys.path.insert(0, PROJECT_ROOT)
+    from src import feature_extraction, metrics
+    from src.feature_store import get_feature_store
+    from src.run_training import train_model
+    from src.classify_playlist import classify_and_create
+
+    # Stores, caches and models are relative paths, so they all land in the temp dir
+    workdir = tempfile.mkdtemp(prefix=f"e2e-{n}-")
+    os.chdir(workdir)
+    os.makedirs('models', exist_ok=True)
+
+    install_fakes(feature_extraction, metrics, args.download_latency, args.fake_ast)
+    feature_extraction.ANALYSIS_RANGE = (0.0, args.window)
+    result = {'size': n, 'workdir': workdir}
+
+    # --- 1. Feature extraction, one song at a time ---
+    sample = min(n, args.extract_sample)
+    per_track, rows = [], []
+    start = time.perf_counter()
+    for i in range(sample):
+        t0 = time.perf_counter()
+        features = feature_extraction.process_and_extract_features(f"Trainer {i}", f"Training Song {i}")
+        per_track.append(time.perf_counter() - t0)
+        if features:
+            rows.append(features)
+    result['extract'] = {
+        'tracks': sample,
+        'succeeded': len(rows),
+        'seconds': time.perf_counter() - start,
+        'per_track': percentiles(per_track),
+    }
+    if not rows:
+        raise RuntimeError("feature extraction failed for every synthetic track")
+
+    # --- 2. Training on a store of n rows built around the extracted ones ---
+    rng = np.random.default_rng(0)
+    columns = list(rows[0])
+    base = np.array([[r[c] for c in columns] for r in rows], dtype=np.float64)
+    train_rows = max(n, MIN_TRAIN_ROWS)
+    store = get_feature_store()
+    batch = []
+    for i in range(train_rows):
+        label = DEFAULT_LABELS[i % len(DEFAULT_LABELS)]
+        offset = 0.5 * (i % len(DEFAULT_LABELS))    # Gives each label something to learn
+        values = base[i % len(base)] * (1 + 0.05 * rng.standard_normal(len(columns))) + offset
+        batch.append({**dict(zip(columns, values)), 'artist': f"Trainer {i}", 'track': f"Row {i}",
+                      'label': label, 'track_id': f"train{i:08d}"})
+        if len(batch) == 5000:
+            store.append(batch)
+            batch = []
+    store.append(batch)
+
+    start = time.perf_counter()
+    train_model(show_plot=False)
+    result['train'] = {'rows': train_rows, 'seconds': time.perf_counter() - start}
+
+    # --- 3. Sorting the whole fake playlist ---
+    metrics.REGISTRY.reset()
+    track_timings, classified = [], [0]
+
+    def progress(artist, name, tid, label, conf, timings=None):
+        classified[0] += 1
+        if timings:
+            track_timings.append(timings)
+
+    start = time.perf_counter()
+    classify_and_create(source_id, callback=progress, parallel=not args.sequential, track_timings=True)
+    seconds = time.perf_counter() - start
+
+    stages = {}
+    for record in track_timings:
+        for stage, value in record.items():
+            stages.setdefault(stage, []).append(value)
+    added = sum(len(p['tracks']) for p in fake.playlists.values() if p['name'] in DEFAULT_LABELS)
+    result['classify'] = {
+        'tracks': n,
+        'classified': classified[0],
+        'added': added,
+        'seconds': seconds,
+        'tracks_per_minute': classified[0] / seconds * 60 if seconds else None,
+        'stages': {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        'stage_totals': stage_totals(metrics),
+        'spotify_requests': fake.requests,
+        'spotify_throttled': fake.throttled,
+    }
+    result['peak_rss_mb'] = peak_rss_mb()
+    fake.stop()
+    return result
+
+
+# --- Baseline comparison ---
+def _lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns a list of regression messages (empty when everything is within tolerance)."""
+    previous = {run['size']: run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in results['runs']:
+        old = previous.get(run['size'])
+        if old is None:
+            continue
+        for path, higher_is_better in COMPARED:
+            new_value, old_value = _lookup(run, path), _lookup(old, path)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            status = 'REGRESSION' if worse > tolerance else 'ok'
+            name = '.'.join(path)
+            print(f"  [{run['size']:>6}] {name:<28} {old_value:12.3f} -> {new_value:12.3f} ({change * 100:+.1f}%) {status}")
+            if worse > tolerance:
+                regressions.append(f"size {run['size']}: {name} {change * 100:+.1f}%")
+    return regressions
+
+
+def print_summary(run):
+    c = run['classify']
+    print(f"\n--- {run['size']} tracks ---")
+    print(f"  extract:  {run['extract']['per_track']['p50'] * 1000:8.1f} ms/track (p50 of {run['extract']['tracks']})")
+    print(f"  train:    {run['train']['seconds']:8.2f} s on {run['train']['rows']} rows")
+    print(f"  classify: {c['tracks_per_minute']:8.1f} tracks/min ({c['classified']}/{c['tracks']} in {c['seconds']:.1f}s,"
+          f" {c['spotify_requests']} Spotify requests)")
+    for stage, p in c['stages'].items():
+        print(f"    {stage:<18} p50 {p['p50'] * 1000:8.1f} ms   p90 {p['p90'] * 1000:8.1f} ms   p99 {p['p99'] * 1000:8.1f} ms")
+    print(f"  peak RSS: {run['peak_rss_mb']:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput benchmark.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Playlist sizes to run")
+    parser.add_argument('--output', default=RESULTS_PATH, help="Where to write the JSON results")
+    parser.add_argument('--baseline', default=None, help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help=f"Also write the results to {BASELINE_PATH}")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--window', type=float, default=30.0, help="Seconds of audio analysed per track")
+    parser.add_argument('--extract-sample', type=int, default=20, help="Tracks timed through process_and_extract_features")
+    parser.add_argument('--download-latency', type=float, default=0.0, help="Simulated seconds per audio fetch")
+    parser.add_argument('--spotify-latency', type=float, default=0.0, help="Simulated seconds per Spotify response")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Fraction of Spotify requests answered with 429")
+    parser.add_argument('--fake-ast', action='store_true', help="Replace the AST with a cheap stand-in")
+    parser.add_argument('--sequential', action='store_true', help="Use the sequential path instead of the pipeline")
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)   # Child process mode
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run_size(args.run_size, args), f)
+        return
+
+    passthrough = [
+        '--window', str(args.window), '--extract-sample', str(args.extract_sample),
+        '--download-latency', str(args.download_latency), '--spotify-latency', str(args.spotify_latency),
+        '--rate-limit', str(args.rate_limit),
+    ] + (['--fake-ast'] if args.fake_ast else []) + (['--sequential'] if args.sequential else [])
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': {k: v for k, v in vars(args).items() if k not in ('run_size', 'output', 'baseline', 'save_baseline')},
+        'runs': [],
+    }
+    for n in args.sizes:
+        print(f"\nRunning {n} tracks...")
+        fd, child_output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.end_to_end', '--run-size', str(n), '--output', child_output] + passthrough,
+            cwd=PROJECT_ROOT, check=True
+        )
+        with open(child_output, 'r', encoding='utf-8') as f:
+            run = json.load(f)
+        os.remove(child_output)
+        results['runs'].append(run)
+        print_summary(run)
+
+    for path in [args.output] + ([BASELINE_PATH] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to '{path}'")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n--- Compared with {args.baseline} (tolerance {args.tolerance * 100:.0f}%) ---")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# Local stand-in for the parts of the Spotify Web API this project uses.
+# Start it, then point the client at it before importing src.spotify_client:
+#   SPOTIFY_API_PREFIX=http://127.0.0.1:<port>/v1/
+# Run standalone with: python -m benchmarks.fake_spotify --tracks 100 --port 8765
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+USER_ID = 'benchmark-user'
+DEFAULT_LABELS = ['Chill', 'Energetic', 'Focus', 'Melancholy', 'Party']
+
+
+class FakeSpotify:
+    """
+    In-memory Spotify: one user, their playlists and a catalogue of tracks.
+    Serves paging (`next` links), snapshot IDs that change on every edit,
+    playlist creation, track adds and search over HTTP. `rate_limit` is the
+    fraction of requests answered with 429 + Retry-After, to exercise the
+    client's backoff; `latency` adds a fixed delay to every response.
+    """
+
+    def __init__(self, rate_limit=0.0, retry_after=1, latency=0.0, seed=0):
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.tracks = {}
+        self.playlists = {}
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --- Data ---
+    def add_track(self, artist, name):
+        track_id = f"trk{len(self.tracks):08d}"
+        self.tracks[track_id] = {
+            'id': track_id,
+            'name': name,
+            'uri': f"spotify:track:{track_id}",
+            'artists': [{'name': artist}],
+        }
+        return self.tracks[track_id]
+
+    def add_playlist(self, name, track_ids=()):
+        playlist_id = f"pl{len(self.playlists):06d}"
+        self.playlists[playlist_id] = {'id': playlist_id, 'name': name, 'tracks': list(track_ids), 'version': 0}
+        return playlist_id
+
+    def make_library(self, n_tracks, labels=DEFAULT_LABELS, source_name='Benchmark Inbox'):
+        """Adds `n_tracks` synthetic tracks in one source playlist plus one empty playlist per label."""
+        ids = [self.add_track(f"Artist {i % 997}", f"Synthetic Song {i}")['id'] for i in range(n_tracks)]
+        for label in labels:
+            self.add_playlist(label)
+        return self.add_playlist(source_name, ids)
+
+    def _snapshot(self, playlist):
+        return f"{playlist['id']}-v{playlist['version']}"
+
+    # --- Server ---
+    def start(self, host='127.0.0.1', port=0):
+        """Serves on a background thread; returns the API prefix to use."""
+        fake = self
+
+        class Handler(_Handler):
+            api = fake
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.prefix
+
+    @property
+    def prefix(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # --- Routing ---
+    def handle(self, method, path, query, body):
+        """Returns (status, payload, headers) for one request."""
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit and self.random.random() < self.rate_limit:
+                self.throttled += 1
+                return 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, \
+                    {'Retry-After': str(self.retry_after)}
+
+            if method == 'GET' and path == 'me':
+                return 200, {'id': USER_ID, 'display_name': 'Benchmark'}, {}
+            if method == 'GET' and path == 'me/playlists':
+                return 200, self._page(path, query, [self._playlist_summary(p) for p in self.playlists.values()], 50), {}
+            if method == 'GET' and path == 'search':
+                return 200, self._search(query), {}
+
+            match = re.fullmatch(r'users/[^/]+/playlists', path)
+            if method == 'POST' and match:
+                playlist_id = self.add_playlist(body.get('name', 'Untitled'))
+                return 201, self._playlist_summary(self.playlists[playlist_id]), {}
+
+            match = re.fullmatch(r'playlists/([^/]+)(/tracks|/items)?', path)
+            if not match or match.group(1) not in self.playlists:
+                return 404, {'error': {'status': 404, 'message': f'Unknown endpoint {method} {path}'}}, {}
+            playlist = self.playlists[match.group(1)]
+            if match.group(2) is None:
+                return 200, self._playlist_summary(playlist), {}
+            if method == 'GET':
+                items = [{'track': self.tracks[t]} for t in playlist['tracks']]
+                return 200, self._page(path, query, items, 100), {}
+            if method == 'POST':
+                uris = body.get('uris', [])
+                if len(uris) > 100:
+                    return 400, {'error': {'status': 400, 'message': 'Too many tracks requested'}}, {}
+                playlist['tracks'].extend(uri.rsplit(':', 1)[-1] for uri in uris)
+                playlist['version'] += 1
+                return 201, {'snapshot_id': self._snapshot(playlist)}, {}
+            return 405, {'error': {'status': 405, 'message': 'Method not allowed'}}, {}
+
+    def _playlist_summary(self, playlist):
+        return {
+            'id': playlist['id'],
+            'name': playlist['name'],
+            'uri': f"spotify:playlist:{playlist['id']}",
+            'snapshot_id': self._snapshot(playlist),
+            'owner': {'id': USER_ID},
+            'tracks': {'total': len(playlist['tracks'])},
+        }
+
+    def _page(self, path, query, items, default_limit):
+        limit = int(query.get('limit', [default_limit])[0])
+        offset = int(query.get('offset', [0])[0])
+        page = items[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(items):
+            next_url = f"{self.prefix}{path}?limit={limit}&offset={offset + limit}"
+        return {'items': page, 'limit': limit, 'offset': offset, 'total': len(items), 'next': next_url}
+
+    def _search(self, query):
+        q = query.get('q', [''])[0].lower()
+        limit = int(query.get('limit', [10])[0])
+        terms = [t.strip() for t in re.split(r'\w+:', q) if t.strip()]
+        hits = [
+            t for t in self.tracks.values()
+            if all(term in f"{t['artists'][0]['name']} {t['name']}".lower() for term in terms)
+        ]
+        return {'tracks': {'items': hits[:limit], 'total': len(hits), 'next': None}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    api = None
+    protocol_version = 'HTTP/1.1'   # Keep-alive, like the real API
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        path = url.path[len('/v1/'):] if url.path.startswith('/v1/') else url.path.lstrip('/')
+
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        status, payload, headers = self.api.handle(method, path, parse_qs(url.query), body)
+
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def log_message(self, format, *args):
+        pass   # One line per request would drown the benchmark output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Spotify Web API for offline runs.")
+    parser.add_argument('--tracks', type=int, default=100, help="Tracks in the source playlist")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+
+    fake = FakeSpotify(rate_limit=args.rate_limit, latency=args.latency)
+    source = fake.make_library(args.tracks)
+    prefix = fake.start(port=args.port)
+    print(f"Fake Spotify listening: SPOTIFY_API_PREFIX={prefix}")
+    print(f"Source playlist ID: {source}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
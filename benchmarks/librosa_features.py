@@ -0,0 +1,89 @@
+# Run from the project root: python -m benchmarks.librosa_features
+
+import time
+import argparse
+import numpy as np
+
+from src.feature_extraction import extract_librosa_features, LIBROSA_SAMPLE_RATE, AST_SAMPLE_RATE, AST_DURATION
+
+
+def legacy_features(path):
+    """
+    The pre-shared-STFT extraction: every feature runs its own transform and
+    the file is decoded twice (16 kHz for the AST, 22.05 kHz for librosa).
+    """
+    import librosa
+    y_ast, _ = librosa.load(path, sr=AST_SAMPLE_RATE, duration=AST_DURATION)
+    y, sr = librosa.load(path, mono=True, duration=60)
+    f = {}
+    f['tempo'] = librosa.feature.tempo(y=y, sr=sr)[0]
+    rms = librosa.feature.rms(y=y)
+    f['rms_mean'], f['rms_std'] = np.mean(rms), np.std(rms)
+    c = librosa.feature.spectral_centroid(y=y, sr=sr)
+    f['spectral_centroid_mean'], f['spectral_centroid_std'] = np.mean(c), np.std(c)
+    b = librosa.feature.spectral_bandwidth(y=y, sr=sr)
+    f['spectral_bandwidth_mean'], f['spectral_bandwidth_std'] = np.mean(b), np.std(b)
+    z = librosa.feature.zero_crossing_rate(y)
+    f['zero_crossing_rate_mean'], f['zero_crossing_rate_std'] = np.mean(z), np.std(z)
+    m = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
+    for i in range(20):
+        f[f'mfcc_{i+1}_mean'], f[f'mfcc_{i+1}_std'] = np.mean(m[i]), np.std(m[i])
+    return f
+
+
+def current_features(path):
+    """Single decode at 22.05 kHz, in-memory resample for the AST, shared STFT."""
+    import librosa
+    y, sr = librosa.load(path, sr=LIBROSA_SAMPLE_RATE, mono=True, duration=AST_DURATION)
+    librosa.resample(y, orig_sr=sr, target_sr=AST_SAMPLE_RATE)
+    return extract_librosa_features(y, sr)
+
+
+def synthetic_track(path, seconds=AST_DURATION, sr=44100, seed=0):
+    """Writes a noisy, beat-driven test tone to `path` as WAV."""
+    import soundfile as sf
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.1 * rng.standard_normal(t.size)
+    y *= 0.5 + 0.5 * (np.sin(2 * np.pi * 2 * t) > 0)   # 120 BPM amplitude pulses
+    sf.write(path, y.astype(np.float32), sr)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-track librosa feature extraction benchmark.")
+    parser.add_argument('files', nargs='*', help="Audio files to time (default: one synthetic track)")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files
+    if not files:
+        import os
+        import tempfile
+        files = [synthetic_track(os.path.join(tempfile.mkdtemp(), 'synthetic.wav'))]
+
+    for path in files:
+        timings = {}
+        results = {}
+        for name, fn in (('legacy', legacy_features), ('shared_stft', current_features)):
+            best = float('inf')
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                results[name] = fn(path)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        assert list(results['legacy']) == list(results['shared_stft']), "Column names differ!"
+        worst = max(
+            abs(results['legacy'][k] - results['shared_stft'][k]) / (abs(results['legacy'][k]) + 1e-9)
+            for k in results['legacy']
+        )
+        print(f"{path}")
+        print(f"  legacy:      {timings['legacy'] * 1000:8.1f} ms")
+        print(f"  shared STFT: {timings['shared_stft'] * 1000:8.1f} ms")
+        print(f"  speedup:     {timings['legacy'] / timings['shared_stft']:8.2f}x")
+        print(f"  max relative feature difference: {worst:.2e}")
+
+
+if __name__ == '__main__':
+    main()
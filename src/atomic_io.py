@@ -0,0 +1,46 @@
+import os
+import json
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding=None, newline=None):
+    """
+    Opens a uniquely named temp file next to `path` and renames it over
+    `path` once the block finishes. Readers only ever see the old file or
+    the complete new one, and concurrent writers (threads or processes)
+    never share a temp file. If the block raises, the temp file is removed
+    and `path` is left untouched.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    if 'b' not in mode and encoding is None:
+        encoding = 'utf-8'
+    tmp = tempfile.NamedTemporaryFile(
+        mode, dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp',
+        delete=False, encoding=encoding, newline=newline
+    )
+    try:
+        with tmp as f:
+            yield f
+        os.replace(tmp.name, path)
+    except BaseException:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path, data, **kwargs):
+    """json.dump()s `data` to `path` atomically; keyword arguments go to json.dump."""
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **kwargs)
+
+
+def copy_file(src, path):
+    """Copies `src` over `path` atomically."""
+    with open(src, 'rb') as source, atomic_open(path, 'wb') as f:
+        shutil.copyfileobj(source, f)
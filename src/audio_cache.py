@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+from src.atomic_io import atomic_open, write_json
+
+# --- CONFIGURATION ---
+CACHE_DIR = os.path.join('data', 'audio_cache')
+INDEX_FILE = 'index.json'
+MAX_CACHE_BYTES = 2 * 1024 ** 3   # 2 GB disk budget; least recently used entries go first
+ACCESS_SAVE_INTERVAL = 30         # Seconds between index saves that only record cache hits
+
+
+class AudioCache:
+    """
+    Content-addressed store of decoded audio.
+
+    Entries are keyed by the resolved YouTube video ID (plus the analysis
+    window "variant" when only part of the song was fetched). The samples are
+    stored once per content hash as mono float16 .npy files (half the size of
+    float32 and no codec needed to read them back). A JSON index maps the
+    video ID to the file and also records artist/title and the Spotify track
+    ID, so a song can be found again before yt-dlp is even asked. Every file,
+    index included, is written to a temp file and renamed into place, so a
+    crash mid-write never leaves a partial entry that could be reused.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self.entries = self._load_index()
+        self._last_save = time.monotonic()
+        self._by_name = {}
+        self._by_spotify = {}
+        for video_id, entry in self.entries.items():
+            self._index_entry(video_id, entry)
+
+    # --- Index ---
+    def _load_index(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[AUDIO CACHE] Index unreadable, starting empty: {e}")
+            return {}
+        # Drop entries whose audio file went missing
+        return {k: v for k, v in entries.items() if os.path.exists(os.path.join(self.root, v['file']))}
+
+    def _index_entry(self, key, entry):
+        variant = entry.get('variant')
+        if entry.get('artist') or entry.get('title'):
+            self._by_name[(variant, entry.get('artist'), entry.get('title'))] = key
+        if entry.get('spotify_id'):
+            self._by_spotify[(variant, entry['spotify_id'])] = key
+
+    def save(self):
+        with self._lock:
+            write_json(os.path.join(self.root, INDEX_FILE), self.entries)
+            self._last_save = time.monotonic()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(e['bytes'] for e in self._files().values())
+
+    def _files(self):
+        """One entry per content file (several video IDs can share one)."""
+        return {e['file']: e for e in self.entries.values()}
+
+    # --- Lookup ---
+    def find(self, video_id=None, artist=None, title=None, spotify_id=None, variant=None):
+        """Returns the index key of a cached entry matching any of the keys, or None."""
+        with self._lock:
+            if video_id and _entry_key(video_id, variant) in self.entries:
+                return _entry_key(video_id, variant)
+            if spotify_id and (variant, spotify_id) in self._by_spotify:
+                return self._by_spotify[(variant, spotify_id)]
+            return self._by_name.get((variant, artist, title))
+
+    def get(self, video_id=None, artist=None, title=None, spotify_id=None, variant=None):
+        """
+        Returns (segments, sample_rate) for a cached song, or None. `segments`
+        is a list of float32 arrays, one per stored analysis window. `variant`
+        names the window the audio was cut with; None is the default window.
+        """
+        with self._lock:
+            key = self.find(video_id, artist, title, spotify_id, variant)
+            if key is None:
+                return None
+            entry = self.entries[key]
+            entry['last_access'] = time.time()
+            path = os.path.join(self.root, entry['file'])
+            # Persist access times (throttled) so LRU order survives a restart
+            if time.monotonic() - self._last_save >= ACCESS_SAVE_INTERVAL:
+                self.save()
+        try:
+            samples = np.load(path).astype(np.float32)
+            bounds = np.cumsum(entry.get('segments') or [len(samples)])[:-1]
+            return np.split(samples, bounds), entry['sample_rate']
+        except (OSError, ValueError) as e:
+            print(f"[AUDIO CACHE] Dropping unreadable entry {key}: {e}")
+            with self._lock:
+                self._drop(key)
+            return None
+
+    # --- Writing ---
+    def put(self, video_id, segments, sample_rate, artist=None, title=None, spotify_id=None, variant=None):
+        """
+        Stores decoded audio (a list of sample arrays, one per analysis window)
+        under `video_id` and `variant`, then evicts old entries if over budget.
+        Returns the segments exactly as a later get() will read them back
+        (rounded to float16), so a miss can use the same samples a hit would.
+        """
+        data = np.concatenate([np.asarray(seg, dtype=np.float16) for seg in segments])
+        digest = hashlib.sha1(data.tobytes()).hexdigest()
+        filename = f"{digest}.npy"
+        path = os.path.join(self.root, filename)
+
+        with self._lock:
+            if not os.path.exists(path):
+                with atomic_open(path, 'wb') as f:
+                    np.save(f, data)
+
+            entry = {
+                'file': filename,
+                'hash': digest,
+                'bytes': os.path.getsize(path),
+                'sample_rate': sample_rate,
+                'last_access': time.time(),
+                'artist': artist,
+                'title': title,
+                'spotify_id': spotify_id,
+                'variant': variant,
+                'segments': [len(seg) for seg in segments],
+            }
+            key = _entry_key(video_id, variant)
+            previous = self.entries.get(key)
+            self.entries[key] = entry
+            self._index_entry(key, entry)
+
+            # Re-fetched audio that hashes differently replaces the old file
+            if previous and previous['file'] != filename and previous['file'] not in self._files():
+                try:
+                    os.remove(os.path.join(self.root, previous['file']))
+                except OSError:
+                    pass
+            self._evict()
+            self.save()
+        return np.split(data.astype(np.float32), np.cumsum(entry['segments'])[:-1])
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        name = (entry.get('variant'), entry.get('artist'), entry.get('title'))
+        if self._by_name.get(name) == key:
+            del self._by_name[name]
+        spotify_key = (entry.get('variant'), entry.get('spotify_id'))
+        if entry.get('spotify_id') and self._by_spotify.get(spotify_key) == key:
+            del self._by_spotify[spotify_key]
+
+    def _evict(self):
+        """Removes least recently used content files until we're back under budget."""
+        keys_by_file, last_used = {}, {}
+        for key, e in self.entries.items():
+            keys_by_file.setdefault(e['file'], []).append(key)
+            last_used[e['file']] = max(last_used.get(e['file'], 0), e['last_access'])
+        total = sum(self.entries[keys[0]]['bytes'] for keys in keys_by_file.values())
+        if total <= self.max_bytes:
+            return
+
+        for filename in sorted(last_used, key=last_used.get):
+            if total <= self.max_bytes:
+                break
+            keys = keys_by_file[filename]
+            total -= self.entries[keys[0]]['bytes']
+            for key in keys:
+                self._drop(key)
+            try:
+                os.remove(os.path.join(self.root, filename))
+            except OSError:
+                pass
+
+
+def _entry_key(video_id, variant):
+    return video_id if variant is None else f"{video_id}|{variant}"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_audio_cache():
+    """Returns the shared AudioCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache()
+        return _cache
@@ -0,0 +1,65 @@
+import subprocess
+import numpy as np
+
+from src.config import FFMPEG_PATH
+
+# --- CONFIGURATION ---
+# yt-dlp options shared by every lookup. Firefox cookies + Node.js are what get
+# us past YouTube's bot checks (see _download_to_disk in feature_extraction).
+YDL_BASE_OPTS = {
+    'format': 'bestaudio/best',
+    'cookiesfrombrowser': ('firefox',),
+    'js_runtimes': {'node': {}},
+    'quiet': True,
+    'no_warnings': True,
+}
+STREAM_TIMEOUT = 120   # Seconds before we give up on an ffmpeg pipe
+
+
+def resolve_stream(query):
+    """
+    Resolves a yt-dlp query (e.g. "ytsearch1:artist title") to its best audio
+    stream without downloading anything. Returns the info dict of the first
+    result (it carries 'url', 'id' and 'http_headers'), or None.
+    """
+    import yt_dlp
+    try:
+        with yt_dlp.YoutubeDL(YDL_BASE_OPTS) as ydl:
+            info = ydl.extract_info(query, download=False)
+        if info and 'entries' in info:
+            info = next(iter(info['entries']), None)
+        return info if info and info.get('url') else None
+    except Exception as e:
+        print(f"\n[STREAM ERROR] yt-dlp could not resolve '{query}': {e}")
+        return None
+
+
+def stream_pcm(info, sample_rate, duration=None, offset=None):
+    """
+    Pipes a resolved stream through ffmpeg and reads mono float32 PCM at
+    `sample_rate` straight off stdout. Nothing touches the disk and nothing is
+    re-encoded. Returns a 1-D numpy array, or None if ffmpeg fails.
+    """
+    cmd = [FFMPEG_PATH, '-nostdin', '-loglevel', 'error']
+
+    headers = info.get('http_headers') or {}
+    if headers:
+        cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    if offset:
+        cmd += ['-ss', str(offset)]     # Input seeking: ffmpeg jumps there with a range request
+    cmd += ['-i', info['url']]
+    if duration:
+        cmd += ['-t', str(duration)]
+    cmd += ['-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 'f32le', 'pipe:1']
+
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=True, timeout=STREAM_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        print(f"\n[FFmpeg Error] {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"\n[FFmpeg Error] Stream timed out after {STREAM_TIMEOUT}s")
+        return None
+
+    pcm = np.frombuffer(proc.stdout, dtype=np.float32)
+    return pcm if pcm.size else None
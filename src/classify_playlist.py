@@ -1,106 +1,465 @@
-import pandas as pd
-import os
 import time
-import joblib
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from src.feature_extraction import process_and_extract_features
-from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI
+import numpy as np
+import pandas as pd
+import threading
+from src.feature_extraction import (
+    download_and_decode, acquire_audio, decode_audio,
+    extract_features_from_decoded, AST_BATCH_SIZE
+)
+from src.feature_store import get_feature_store
+from src.sort_state import get_sort_state
+from src.create_playlists import RESULTS_PATH, track_entry, save_classification_results
+from src.track_matching import get_track_matcher, MATCH_THRESHOLD, AUDIO_MATCH_THRESHOLD, USE_AUDIO_NEIGHBOURS
+from src.model_registry import get_classifier
+from src.pipeline import Stage, run_pipeline
+from src import metrics
+from src import spotify_client
+from src.spotify_client import all_pages
 
-CSV_PATH = 'training_features.csv'
+# --- PIPELINE CONFIGURATION ---
+# Degree of parallelism per stage when classify_and_create runs with parallel=True.
+# Download and write are network-bound, decode is CPU-bound (librosa).
+PIPELINE_WORKERS = {'download': 4, 'decode': 2, 'write': 2}
+DECODE_IN_PROCESSES = False
+SPOTIFY_BATCH_SIZE = 100   # Max tracks per playlist_add_items call
+ADD_RETRY_BACKOFF = 5.0    # Seconds before a failed add is retried; doubles per failure in a row
+ADD_RETRY_MAX = 300.0      # Cap on that backoff
 
 def get_spotify_client():
-    return spotipy.Spotify(auth_manager=SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID, 
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope="playlist-read-private playlist-modify-public playlist-modify-private"
-    ))
+    return spotify_client.get_spotify()
 
 def get_user_playlists():
-    """Returns all user playlists for the frontend dropdown."""
-    sp = get_spotify_client()
-    playlists = []
-    results = sp.current_user_playlists()
-    playlists.extend(results['items'])
-    while results['next']:
-        results = sp.next(results)
-        playlists.extend(results['items'])
-    return [{'id': p['id'], 'name': p['name'], 'total': p['tracks']['total']} for p in playlists]
-
-def is_song_in_playlist(sp, playlist_id, track_id):
-    """Checks if a song is already in a playlist to prevent duplicates."""
-    results = sp.playlist_items(playlist_id, fields="items(track(id)),next")
-    items = results['items']
-    while results['next']:
-        results = sp.next(results)
-        items.extend(results['items'])
-    return any(item['track']['id'] == track_id for item in items if item['track'])
-
-def save_final_result(artist, name, track_id, label, features, add_repeats):
-    """Adds the track to Spotify and updates the local CSV cache."""
-    sp = get_spotify_client()
-    
-    all_p = sp.current_user_playlists()['items']
-    target_id = next((p['id'] for p in all_p if p['name'] == label), None)
-
-    if target_id:
-        if not is_song_in_playlist(sp, target_id, track_id) or add_repeats:
-            sp.playlist_add_items(target_id, [track_id])
-            print(f"Added {name} to {label}")
-            
-            # Append to CSV Memory so we don't need to re-extract in the future
-            new_row = {**features, 'artist': artist, 'track': name, 'label': label}
-            pd.DataFrame([new_row]).to_csv(CSV_PATH, mode='a', header=not os.path.exists(CSV_PATH), index=False)
-
-def classify_and_create(playlist_id, add_repeats=False, callback=None):
-    """The main worker function."""
+    """Returns all user playlists for the frontend dropdown (cached for a minute)."""
+    return [{'id': p['id'], 'name': p['name'], 'total': p['total']} for p in spotify_client.get_user_playlists()]
+
+class PlaylistSession:
+    """
+    Per-job view of the user's target playlists.
+
+    Label -> playlist ID is resolved once from the (cached) listing of the
+    user's playlists, and each target playlist's track IDs are fetched once the
+    first time we write to it (reusing the shared cache when its snapshot_id is
+    unchanged) and then kept up to date locally. Adds are buffered and
+    sent in 100-track batches, either when a buffer fills, every
+    `flush_interval` seconds, or on close(). Spotify is never called while
+    the session's lock is held. A failed send keeps its tracks buffered and
+    that playlist isn't tried again for ADD_RETRY_BACKOFF seconds, doubling
+    with every failure in a row; whatever close() still can't send is
+    recorded in `dropped`.
+    """
+
+    def __init__(self, sp, flush_interval=5.0):
+        self.sp = sp
+        self._lock = threading.RLock()
+        self._members = {}
+        self._pending = {}
+        self._pending_rows = []
+        self._failures = {}      # playlist_id -> failed sends in a row
+        self._retry_at = {}      # playlist_id -> monotonic time before which it isn't retried
+        self.dropped = set()     # Track IDs whose add failed for good on close()
+        self.playlist_ids = {}
+        self._snapshots = {}
+        for p in spotify_client.get_user_playlists():
+            self.playlist_ids.setdefault(p['name'], p['id'])
+            self._snapshots.setdefault(p['id'], p['snapshot_id'])
+
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    def _flush_periodically(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the timer alive; anything unsent is retried next time
+                print(f"[SPOTIFY] Periodic flush failed: {e}")
+
+    def _track_ids(self, playlist_id):
+        with self._lock:
+            members = self._members.get(playlist_id)
+        if members is None:
+            # Fetched without the lock; if two threads race, the first set stored wins
+            items = spotify_client.get_playlist_items(
+                playlist_id, self._snapshots.get(playlist_id), fields="items(track(id)),next"
+            )
+            fetched = {item['track']['id'] for item in items if item['track']}
+            with self._lock:
+                members = self._members.setdefault(playlist_id, fetched)
+        return members
+
+    def add(self, label, track_id, add_repeats=False, feature_row=None):
+        """
+        Queues a track for the playlist named `label`. Returns True if it will
+        be added, False if the playlist doesn't exist or already has the song.
+        """
+        target_id = self.playlist_ids.get(label)
+        if not target_id:
+            return False
+        members = self._track_ids(target_id)
+        with self._lock:
+            if track_id in members and not add_repeats:
+                return False
+
+            members.add(track_id)
+            batch = self._pending.setdefault(target_id, [])
+            batch.append(track_id)
+            if feature_row:
+                self._pending_rows.append(feature_row)
+            full = len(batch) >= SPOTIFY_BATCH_SIZE and time.monotonic() >= self._retry_at.get(target_id, 0)
+            batch = self._pending.pop(target_id) if full else None
+        if batch:
+            self._send(target_id, batch)
+        return True
+
+    def _send(self, playlist_id, batch, final=False):
+        """
+        Sends a batch taken out of the buffer. On failure the unsent tracks go
+        back to the front of the buffer and the playlist backs off, or, on the
+        final flush, they are forgotten (and dropped from the known members)
+        with a message. Returns False if anything was left unsent.
+        """
+        sent = 0
+        try:
+            for i in range(0, len(batch), SPOTIFY_BATCH_SIZE):
+                with metrics.timed('spotify_write'):
+                    self.sp.playlist_add_items(playlist_id, batch[i:i + SPOTIFY_BATCH_SIZE])
+                sent = min(len(batch), i + SPOTIFY_BATCH_SIZE)
+        except Exception as e:
+            unsent = batch[sent:]
+            with self._lock:
+                if final:
+                    self._members.get(playlist_id, set()).difference_update(unsent)
+                    self.dropped.update(unsent)
+                    print(f"[SPOTIFY] Could not add {len(unsent)} tracks to playlist {playlist_id}, giving up: {e}")
+                else:
+                    self._pending[playlist_id] = unsent + self._pending.get(playlist_id, [])
+                    failures = self._failures[playlist_id] = self._failures.get(playlist_id, 0) + 1
+                    delay = min(ADD_RETRY_MAX, ADD_RETRY_BACKOFF * 2 ** (failures - 1))
+                    self._retry_at[playlist_id] = time.monotonic() + delay
+                    print(f"[SPOTIFY] Could not add {len(unsent)} tracks to playlist {playlist_id}, "
+                          f"retrying in {delay:.0f}s: {e}")
+            return False
+        finally:
+            if sent:
+                spotify_client.invalidate(playlist_id)
+        with self._lock:
+            self._failures.pop(playlist_id, None)
+            self._retry_at.pop(playlist_id, None)
+        return True
+
+    def flush(self, final=False):
+        """
+        Sends every buffered add whose playlist isn't backing off (all of
+        them when `final`) and saves the matching feature rows.
+        """
+        with self._lock:
+            now = time.monotonic()
+            batches = {
+                playlist_id: self._pending.pop(playlist_id) for playlist_id in list(self._pending)
+                if final or now >= self._retry_at.get(playlist_id, 0)
+            }
+            rows, self._pending_rows = self._pending_rows, []
+        for playlist_id, batch in batches.items():
+            self._send(playlist_id, batch, final)
+        # Append to the feature store so we don't need to re-extract in the future
+        store = get_feature_store()
+        with metrics.timed('store_write'):
+            store.append([r for r in rows if not store.contains(r['artist'], r['track'], r['track_id'])])
+
+    def close(self):
+        self._stop.set()
+        self.flush(final=True)
+
+def save_final_result(artist, name, track_id, label, features, add_repeats, session=None):
+    """
+    Adds the track to Spotify and updates the local feature store. Pass the
+    job's PlaylistSession to batch the writes; without one the track is
+    written immediately through a throwaway session.
+    """
+    own_session = session is None
+    if own_session:
+        session = PlaylistSession(get_spotify_client(), flush_interval=None)
+
+    # Tracks classified from the cache pass features=None: their row is already stored
+    new_row = {**features, 'artist': artist, 'track': name, 'label': label, 'track_id': track_id} if features else None
+    if session.add(label, track_id, add_repeats, feature_row=new_row):
+        print(f"Added {name} to {label}")
+
+    if own_session:
+        session.close()
+
+def _decode_stage(job):
+    """
+    Pipeline stage: decodes acquired audio. Module-level so it can run in a
+    process pool (the per-track timings travel back with the job, but the
+    histograms recorded in a worker process stay in that process).
+    """
+    job['decoded'] = decode_audio(job.pop('audio', None), job['track']['name'], job['timings'])
+    return job if job['decoded'] is not None else None
+
+def _extract_features(decoded, batch_size):
+    """
+    Like extract_features_from_decoded, except that songs whose librosa
+    features match a stored row closely enough (the same audio saved under
+    other metadata) reuse that row's AST features instead of running the AST.
+    """
+    results = [None] * len(decoded)
+    remaining = list(decoded)
+    if USE_AUDIO_NEIGHBOURS:
+        matcher, store = get_track_matcher(), get_feature_store()
+        for i, d in enumerate(decoded):
+            if d is None:
+                continue
+            match = matcher.match_audio(d[1])
+            if match and match.confidence >= AUDIO_MATCH_THRESHOLD:
+                results[i] = {**store.row_features(match.row), **d[1]}
+                remaining[i] = None
+                metrics.inc('feature_cache_total', result='audio')
+
+    for i, row in enumerate(extract_features_from_decoded(remaining, batch_size=batch_size)):
+        if row is not None:
+            results[i] = row
+    return results
+
+def _predict(model, frame):
+    """
+    Runs one predict_proba over every row of `frame` and returns the
+    (labels, confidences) arrays. Columns are lined up with the ones the
+    model was trained on first, so dict order never matters.
+    """
+    columns = getattr(model, 'feature_names_in_', None)
+    if columns is not None:
+        frame = frame.reindex(columns=columns)
+    probs = model.predict_proba(frame)
+    top_idx = probs.argmax(axis=1)
+    return model.classes_[top_idx], probs[np.arange(len(top_idx)), top_idx]
+
+def _report(track, label, conf, features, add_repeats, session, callback, timings=None):
+    artist, name, tid = track['artists'][0]['name'], track['name'], track['id']
+    metrics.inc('tracks_classified_total', source='extracted' if features else 'cache')
+    if callback:
+        callback(artist, name, tid, label, conf, timings=timings)
+    save_final_result(artist, name, tid, label, features, add_repeats, session)
+
+def _classify_cached(cached, model, store, session, add_repeats, callback, should_stop=None):
+    """
+    Phase 1: predicts every track whose features are already stored with a
+    single vectorized predict_proba call and reports them all right away.
+    `cached` is a list of (track, store_row) pairs.
+    """
+    if not cached:
+        return
+    columns = getattr(model, 'feature_names_in_', None)
+    columns = list(columns) if columns is not None else store.columns
+    with metrics.timed('predict') as span:
+        frame = pd.DataFrame(store.rows_matrix([row for _, row in cached], columns), columns=columns)
+        labels, confs = _predict(model, frame)
+    share = span['seconds'] / len(cached)
+    for (track, _), label, conf in zip(cached, labels, confs):
+        if should_stop and should_stop():
+            return
+        # Cached rows are already in the store, so no feature row needs saving
+        _report(track, label, conf, None, add_repeats, session, callback, {'predict': share})
+
+def _run_pipelined(tracks, model, session, add_repeats, callback, batch_size, workers, ordered, should_stop=None):
+    """
+    Runs download -> decode -> features -> predict -> write as concurrent
+    stages with bounded queues between them, so downloads overlap inference.
+    """
+    workers = {**PIPELINE_WORKERS, **(workers or {})}
+
+    # Every job carries a {stage: seconds} dict; batched stages charge each
+    # track an equal share of the batch
+    def fetch(track):
+        job = {'track': track, 'timings': {}}
+        job['audio'] = acquire_audio(track['artists'][0]['name'], track['name'], track['id'], job['timings'])
+        return job if job['audio'] is not None else None
+
+    def features(jobs):
+        with metrics.timed('features') as span:
+            extracted = _extract_features([j.pop('decoded') for j in jobs], batch_size)
+        for job, row in zip(jobs, extracted):
+            job['features'] = row
+            job['timings']['features'] = span['seconds'] / len(jobs)
+        return [j if j['features'] else None for j in jobs]
+
+    def predict(jobs):
+        with metrics.timed('predict') as span:
+            labels, confs = _predict(model, pd.DataFrame([j['features'] for j in jobs]))
+        for job, label, conf in zip(jobs, labels, confs):
+            job['label'], job['conf'] = label, conf
+            job['timings']['predict'] = span['seconds'] / len(jobs)
+        return jobs
+
+    def write(job):
+        track = job['track']
+        metrics.inc('tracks_classified_total', source='extracted')
+        with metrics.timed('write', into=job['timings']):
+            save_final_result(track['artists'][0]['name'], track['name'], track['id'],
+                              job['label'], job['features'], add_repeats, session)
+        return job
+
+    def on_result(track, job):
+        if callback:
+            callback(track['artists'][0]['name'], track['name'], track['id'], job['label'], job['conf'],
+                     timings=job['timings'])
+
+    run_pipeline(
+        tracks,
+        [
+            Stage('download', fetch, workers=workers['download']),
+            Stage('decode', _decode_stage, workers=workers['decode'], use_processes=DECODE_IN_PROCESSES),
+            Stage('features', features, batch_size=batch_size),
+            Stage('predict', predict, batch_size=batch_size, batch_wait=0.05),
+            Stage('write', write, workers=workers['write']),
+        ],
+        ordered=ordered,
+        on_result=on_result,
+        should_stop=should_stop
+    )
+
+def _run_sequential(tracks, model, session, add_repeats, callback, batch_size, should_stop=None):
+    """Extracts and predicts the tracks one batch at a time on the calling thread."""
+    for start in range(0, len(tracks), batch_size):
+        if should_stop and should_stop():
+            return
+        chunk = tracks[start:start + batch_size]
+        for track in chunk:
+            print(f" -> Analyzing: {track['artists'][0]['name']} - {track['name']}")
+
+        print(f"    (Extracting new audio features for {len(chunk)} songs via yt-dlp & librosa...)")
+        with metrics.timed('extract') as extract_span:
+            decoded = [download_and_decode(t['artists'][0]['name'], t['name'], t['id']) for t in chunk]
+            extracted = _extract_features(decoded, batch_size)
+
+        # Prediction & Assignment, one predict_proba for the whole batch
+        ready = [(t, f) for t, f in zip(chunk, extracted) if f]
+        if not ready:
+            continue
+        with metrics.timed('predict') as predict_span:
+            labels, confs = _predict(model, pd.DataFrame([f for _, f in ready]))
+        timings = {'extract': extract_span['seconds'] / len(chunk), 'predict': predict_span['seconds'] / len(ready)}
+        for (track, features), label, conf in zip(ready, labels, confs):
+            _report(track, label, conf, features, add_repeats, session, callback, dict(timings))
+
+def classify_and_create(playlist_id, add_repeats=False, callback=None, batch_size=AST_BATCH_SIZE,
+                        parallel=False, workers=None, ordered=True, should_stop=None, track_timings=False,
+                        full=False, results_path=RESULTS_PATH):
+    """
+    The main worker function. Tracks already in the feature store (including
+    confident matches under different metadata, see track_matching) are
+    classified first, all in one predict_proba call; only the rest are
+    extracted, `batch_size` songs at a time so the AST model runs one
+    forward pass per batch.
+
+    With `parallel=True` the tracks go through a staged concurrent pipeline
+    instead; `workers` overrides PIPELINE_WORKERS per stage and `ordered`
+    picks between playlist order and completion order for the callbacks.
+
+    `should_stop` is polled between tracks; once it returns True no new
+    track is started and whatever was already classified is still written.
+
+    With `track_timings=True` the callback also gets a `timings` keyword: a
+    {stage: seconds} breakdown of the time spent on that track.
+
+    Runs are incremental (see sort_state): if the playlist's snapshot_id is
+    the one recorded after the last complete run nothing is fetched at all,
+    and otherwise only tracks that weren't sorted before are processed.
+    `full=True` forgets that history and sorts every track again.
+
+    The run's results are merged into `results_path` (skipped when None) as
+    {label: [track_entry(...)]}, each entry carrying its Spotify URI, so
+    create_playlists can add them without searching.
+    """
+    report = callback
+    sorted_ids = []
+    results = {}
+
+    def callback(artist, name, tid, label, conf, timings=None):
+        sorted_ids.append(tid)
+        results.setdefault(str(label), []).append(track_entry(artist, name, tid))
+        if report and track_timings:
+            report(artist, name, tid, label, conf, timings=timings)
+        elif report:
+            report(artist, name, tid, label, conf)
+
     print("[1/5] Authenticating Spotify...")
     sp = get_spotify_client()
     
     print("[2/5] Loading Machine Learning Model...")
-    model = joblib.load('models/song_classifier.joblib')
+    model = get_classifier()
     
-    print("[3/5] Loading local CSV memory...")
-    cache_df = pd.read_csv(CSV_PATH) if os.path.exists(CSV_PATH) else pd.DataFrame()
+    print("[3/5] Loading local feature store...")
+    store = get_feature_store()
+
+    state = get_sort_state()
+    if full:
+        state.reset(playlist_id)
 
     print(f"[4/5] Fetching tracks for playlist ID {playlist_id}...")
-    results = sp.playlist_items(playlist_id)
-    tracks = results['items']
-    while results['next']:
-        results = sp.next(results)
-        tracks.extend(results['items'])
-
-    print(f"[5/5] Processing {len(tracks)} tracks. Starting loop...")
-    for item in tracks:
-        track = item['track']
-        if not track: continue
-        
-        artist, name, tid = track['artists'][0]['name'], track['name'], track['id']
-        print(f" -> Analyzing: {artist} - {name}")
-        
-        # 1. Memory Check
-        match = cache_df[(cache_df['artist'] == artist) & (cache_df['track'] == name)]
-        
-        if not match.empty:
-            print("    (Found in cache, skipping extraction)")
-            features = match.iloc[0].drop(['label', 'artist', 'track']).to_dict()
-        else:
-            print("    (Extracting new audio features via yt-dlp & librosa...)")
-            features = process_and_extract_features(artist, name)
-
-        # 2. Prediction & Assignment
-        if features:
-            probs = model.predict_proba(pd.DataFrame([features]))[0]
-            classes = model.classes_
-            
-            top_idx = probs.argmax()
-            best_label = classes[top_idx]
-            best_conf = probs[top_idx]
-
-            if callback:
-                callback(artist, name, tid, best_label, best_conf)
-
-            save_final_result(artist, name, tid, best_label, features, add_repeats)
-            
-        time.sleep(0.1)
\ No newline at end of file
+    with metrics.timed('playlist_fetch'):
+        # Read before the items: if the playlist changes in between, the older
+        # snapshot is what gets recorded and the next run picks up the rest
+        snapshot_id = sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+        if snapshot_id and snapshot_id == state.snapshot_id(playlist_id):
+            print("      Playlist unchanged since it was last sorted, nothing to do.")
+            metrics.inc('sort_runs_total', result='unchanged')
+            return
+        tracks = [item['track'] for item in all_pages(sp, sp.playlist_items(playlist_id)) if item['track']]
+
+    done = state.processed(playlist_id)
+    if done:
+        new = [t for t in tracks if t['id'] not in done]
+        print(f"      {len(tracks) - len(new)} tracks were sorted on earlier runs, {len(new)} are new.")
+        tracks = new
+    metrics.inc('sort_runs_total', result='delta' if done else 'full')
+    session = PlaylistSession(sp)
+
+    # Split the playlist into tracks we already have features for and new ones.
+    # Besides exact hits this accepts the same song under normalized/variant
+    # metadata, as long as the match is confident enough.
+    matcher = get_track_matcher()
+    cached, uncached, approximate = [], [], 0
+    for track in tracks:
+        match = matcher.match(track['id'], track['artists'][0]['name'], track['name'])
+        if match is None or match.confidence < MATCH_THRESHOLD:
+            uncached.append(track)
+            metrics.inc('feature_cache_total', result='miss')
+            continue
+        cached.append((track, match.row))
+        approximate += match.method not in ('id', 'exact')
+        metrics.inc('feature_cache_total', result=match.method)
+    if approximate:
+        print(f"      {approximate} of the cached tracks matched by normalized or similar titles.")
+
+    completed = False
+    try:
+        print(f"[5/5] {len(cached)} of {len(tracks)} tracks found in cache, classifying them in one batch...")
+        _classify_cached(cached, model, store, session, add_repeats, callback, should_stop)
+
+        if uncached and not (should_stop and should_stop()):
+            if parallel:
+                print(f"      Extracting {len(uncached)} new tracks through the concurrent pipeline...")
+                _run_pipelined(uncached, model, session, add_repeats, callback, batch_size, workers, ordered, should_stop)
+            else:
+                print(f"      Extracting {len(uncached)} new tracks. Starting loop...")
+                _run_sequential(uncached, model, session, add_repeats, callback, batch_size, should_stop)
+        completed = not (should_stop and should_stop())
+    finally:
+        # Push out whatever is still buffered, even if the job failed halfway,
+        # without letting a failure here hide the original exception
+        try:
+            session.close()
+        except Exception as e:
+            print(f"[SPOTIFY] Closing the playlist session failed: {e}")
+        # Sorted tracks are remembered even for a cancelled or failed run, but
+        # only a complete run records the snapshot that lets the next one skip
+        state.mark_processed(playlist_id, [tid for tid in sorted_ids if tid not in session.dropped])
+        if completed and not session.dropped:
+            state.mark_complete(playlist_id, snapshot_id)
+        state.save()
+        if results_path and results:
+            save_classification_results(results, results_path)
@@ -1,62 +1,144 @@
-import pandas as pd
 import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.atomic_io import atomic_open
+
+# --- CONFIGURATION ---
+EXPORT_PATH = os.path.join('data', 'training_features.csv')   # Feature store export that gets cleaned
+OUTPUT_PATH = os.path.join('data', 'training_features_cleaned.csv')
+CHUNK_ROWS = 50000          # Rows held in memory at once
+KEY_COLUMNS = ['artist', 'track']
+NON_ASCII = r'[^\x00-\x7f]'
 
-def is_string_ascii(s):
+def _to_ascii(series):
+    """Folds accents and compatibility forms to ASCII (é -> e, ﬁ -> fi) and drops what's left over."""
+    return series.str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+
+class _NothingToSave(Exception):
+    """Raised inside the output block so an empty result leaves no file behind."""
+
+class _KeySet:
     """
-    A helper function that checks if a string contains only ASCII characters.
-    Returns True if it's pure ASCII, False otherwise.
-    This is a backwards-compatible way of doing .isascii().
+    Set of 64-bit (artist, track) hashes kept as one sorted uint64 array: 8
+    bytes per song instead of a Python tuple of two strings. Membership is a
+    binary search, and each chunk's new keys are merged in once.
     """
-    try:
-        s.encode('ascii')
-        return True
-    except UnicodeEncodeError:
-        return False
 
-def clean_training_data_csv():
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add_new(self, hashes):
+        """Adds `hashes` and returns the mask of the ones not seen before (first occurrence wins)."""
+        pos = np.searchsorted(self._hashes, hashes)
+        seen = np.zeros(len(hashes), dtype=bool)
+        inside = pos < len(self._hashes)
+        seen[inside] = self._hashes[pos[inside]] == hashes[inside]
+        new = ~seen & ~pd.Series(hashes).duplicated().to_numpy()
+        self._hashes = np.sort(np.concatenate([self._hashes, hashes[new]]), kind='mergesort')
+        return new
+
+def clean_training_data_csv(input_path=None, output_path=OUTPUT_PATH, chunk_rows=CHUNK_ROWS,
+                            normalize=False, dedupe=True, encoding='utf-8-sig'):
     """
-    Reads the existing training data, removes rows with non-ASCII characters
-    in the artist or track columns, and saves it to a new, clean file.
+    Streams the training data through in `chunk_rows`-row chunks and writes
+    a clean copy. Without an `input_path` the feature store is exported to
+    EXPORT_PATH first, so it is the data the app and training actually use
+    that gets cleaned. Rows with non-ASCII characters in the artist or track
+    columns are dropped, or with `normalize=True` folded to ASCII and kept
+    (rows that fold to an empty name are still dropped). With `dedupe` only
+    the first row of every (artist, track) pair is kept, across all chunks.
+
+    `encoding` is utf-8-sig, which is how FeatureStore.export_csv writes;
+    pass latin-1 for an old hand-made CSV that isn't valid UTF-8.
+
+    Only one chunk and the hash set of seen keys are ever in memory, so
+    memory stays flat no matter how big the file is. Returns a dict of row
+    counts, or None if the input couldn't be read.
     """
-    input_filename = 'training_features.csv'
-    output_filename = 'training_features_cleaned.csv'
+    if input_path is None:
+        from src.feature_store import get_feature_store
+        input_path = EXPORT_PATH
+        print(f"Exporting the feature store to '{input_path}'...")
+        if not get_feature_store().export_csv(input_path):
+            print("The feature store is empty. Nothing to clean.")
+            return None
+    if not os.path.exists(input_path):
+        print(f"Error: The file '{input_path}' was not found. Nothing to clean.")
+        return None
 
-    if not os.path.exists(input_filename):
-        print(f"Error: The file '{input_filename}' was not found. Nothing to clean.")
-        return
+    stats = {'read': 0, 'non_ascii_dropped': 0, 'normalized': 0, 'duplicates': 0, 'written': 0, 'chunks': 0}
+    keys = _KeySet()
+    start = time.perf_counter()
 
-    print(f"Reading '{input_filename}'...")
+    print(f"Cleaning '{input_path}' in chunks of {chunk_rows} rows...")
     try:
-        df = pd.read_csv(input_filename, encoding='latin-1')
-    except Exception as e:
-        print(f"Could not read the CSV file. Error: {e}")
-        return
+        reader = pd.read_csv(input_path, encoding=encoding, chunksize=chunk_rows)
+        # utf-8-sig on the handle writes the BOM once, not once per chunk
+        with atomic_open(output_path, 'w', encoding='utf-8-sig', newline='') as out:
+            for chunk in reader:
+                stats['chunks'] += 1
+                stats['read'] += len(chunk)
+                for col in KEY_COLUMNS:
+                    chunk[col] = chunk[col].fillna('').astype(str)
 
-    original_rows = len(df)
-    print(f"Loaded {original_rows} total rows.")
+                # --- The Filtering Logic (vectorized over the whole chunk) ---
+                dirty = chunk['artist'].str.contains(NON_ASCII) | chunk['track'].str.contains(NON_ASCII)
+                if normalize and dirty.any():
+                    for col in KEY_COLUMNS:
+                        chunk.loc[dirty, col] = _to_ascii(chunk.loc[dirty, col])
+                    # A name made only of non-Latin characters folds to nothing
+                    emptied = dirty & ((chunk['artist'] == '') | (chunk['track'] == ''))
+                    stats['normalized'] += int((dirty & ~emptied).sum())
+                    dirty = emptied
+                stats['non_ascii_dropped'] += int(dirty.sum())
+                chunk = chunk[~dirty]
 
-    # --- The Filtering Logic ---
-    df['artist'] = df['artist'].fillna('').astype(str)
-    df['track'] = df['track'].fillna('').astype(str)
+                if dedupe and len(chunk):
+                    hashes = pd.util.hash_pandas_object(chunk[KEY_COLUMNS], index=False).to_numpy()
+                    new = keys.add_new(hashes)
+                    stats['duplicates'] += int((~new).sum())
+                    chunk = chunk[new]
 
-    # UPDATED LINE: Replaced .str.isascii() with .apply(is_string_ascii) for compatibility
-    mask = df['artist'].apply(is_string_ascii) & df['track'].apply(is_string_ascii)
+                chunk.to_csv(out, index=False, header=stats['chunks'] == 1)
+                stats['written'] += len(chunk)
+            if not stats['written']:
+                raise _NothingToSave()
+    except _NothingToSave:
+        pass
+    except Exception as e:
+        print(f"Could not clean the CSV file. Error: {e}")
+        return None
 
-    # Apply the mask to keep only the clean rows
-    df_cleaned = df[mask]
-    
-    cleaned_rows = len(df_cleaned)
-    rows_removed = original_rows - cleaned_rows
-    print(f"Removed {rows_removed} rows with non-ASCII characters.")
+    stats['seconds'] = round(time.perf_counter() - start, 2)
+    print(f"Read {stats['read']} rows in {stats['chunks']} chunks ({stats['seconds']}s).")
+    if normalize:
+        print(f"Normalized {stats['normalized']} rows to ASCII.")
+    print(f"Removed {stats['non_ascii_dropped']} rows with non-ASCII characters.")
+    if dedupe:
+        print(f"Removed {stats['duplicates']} duplicate (artist, track) rows.")
 
     # --- Save the Cleaned Data ---
-    if cleaned_rows > 0:
-        print(f"Saving {cleaned_rows} clean rows to '{output_filename}'...")
-        df_cleaned.to_csv(output_filename, index=False, encoding='utf-8-sig')
-        print("Done!")
+    if stats['written'] > 0:
+        print(f"Saved {stats['written']} clean rows to '{output_path}'.")
     else:
         print("No clean data was found to save.")
+    return stats
 
 
 if __name__ == "__main__":
-    clean_training_data_csv()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Stream the feature store (or a CSV) into a cleaned CSV copy.")
+    parser.add_argument('--input', default=None, help="CSV to clean instead of a fresh export of the feature store")
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--normalize', action='store_true', help="Fold non-ASCII names to ASCII instead of dropping them")
+    parser.add_argument('--keep-duplicates', action='store_true', help="Keep repeated (artist, track) rows")
+    parser.add_argument('--encoding', default='utf-8-sig', help="Input encoding (latin-1 for old non-UTF-8 files)")
+    args = parser.parse_args()
+    clean_training_data_csv(args.input, args.output, args.chunk_rows, args.normalize,
+                            not args.keep_duplicates, args.encoding)
@@ -1,44 +1,177 @@
 # In src/create_spotify_playlists.py
 
+import os
 import json
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import time
 
 # Imports from project files
-from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI
+from src.spotify_client import get_spotify
+from src.atomic_io import write_json
 
-def create_playlists():
+# --- CONFIGURATION ---
+RESULTS_PATH = 'classification_results.json'
+RESOLUTION_CACHE_PATH = os.path.join('data', 'track_resolution_cache.json')
+SEARCH_WORKERS = 8          # Concurrent searches; the shared client's token bucket still caps the rate
+CACHE_SAVE_EVERY = 200      # Resolutions between cache checkpoints
+MISS_TTL = 7 * 24 * 3600    # Seconds a "not found on Spotify" answer is trusted before searching again
+SPOTIFY_BATCH_SIZE = 100    # Max tracks per playlist_add_items call
+
+def track_entry(artist, title, track_id=None):
+    """
+    One song in classification_results.json. Entries with a 'uri' are added
+    as-is; legacy "Artist - Title" strings (and entries without a URI) have
+    to be searched for first.
+    """
+    entry = {'artist': artist, 'title': title}
+    if track_id:
+        entry['uri'] = f"spotify:track:{track_id}"
+    return entry
+
+_results_lock = threading.Lock()
+
+def save_classification_results(results, path=RESULTS_PATH):
+    """
+    Merges {playlist name: [track_entry(...), ...]} into the results file
+    atomically. A song that is already in the file (same URI, or same artist
+    and title for entries without one) is moved to its new playlist, so a
+    delta run adds to what earlier runs found instead of replacing it.
+    """
+    def identity(entry):
+        artist, title, uri = _parse_entry(entry)
+        return uri or _cache_key(artist or '', title or '')
+
+    with _results_lock:
+        merged = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    merged = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Results file unreadable, starting a new one: {e}")
+        new = {identity(entry) for entries in results.values() for entry in entries}
+        merged = {name: [e for e in entries if identity(e) not in new] for name, entries in merged.items()}
+        for name, entries in results.items():
+            merged.setdefault(name, []).extend(entries)
+        write_json(path, {name: entries for name, entries in merged.items() if entries}, indent=2, ensure_ascii=False)
+
+def _parse_entry(entry):
+    """Returns (artist, title, uri) for a new-style dict or a legacy "Artist - Title" string."""
+    if isinstance(entry, dict):
+        return entry.get('artist'), entry.get('title'), entry.get('uri')
+    try:
+        artist, title = entry.split(' - ', 1)
+    except ValueError:
+        return None, None, None
+    return artist.strip(), title.strip(), None
+
+def _cache_key(artist, title):
+    return f"{artist.strip().casefold()}\t{title.strip().casefold()}"
+
+
+class ResolutionCache:
+    """
+    Persistent "artist/title -> Spotify URI" map. Songs that weren't found
+    are remembered too, but only for MISS_TTL: a song missing today may be
+    on Spotify next week, so it is searched for again after that.
+    """
+
+    def __init__(self, path=RESOLUTION_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}      # key -> URI
+        self.misses = {}       # key -> time of the search that found nothing
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = data.get('entries', {})
+                self.misses = data.get('misses', {})
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"Resolution cache unreadable, starting empty: {e}")
+
+    def __contains__(self, key):
+        return key in self.entries or time.time() - self.misses.get(key, float('-inf')) < MISS_TTL
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, uri):
+        with self._lock:
+            if uri:
+                self.entries[key] = uri
+                self.misses.pop(key, None)
+            else:
+                self.misses[key] = time.time()
+
+    def save(self):
+        with self._lock:
+            now = time.time()
+            self.misses = {key: t for key, t in self.misses.items() if now - t < MISS_TTL}
+            write_json(self.path, {'entries': self.entries, 'misses': self.misses})
+
+
+def resolve_tracks(sp, songs, cache, workers=SEARCH_WORKERS):
+    """
+    Returns {cache key: uri or None} for every (artist, title) in `songs`.
+    Cached answers are reused; the rest are searched concurrently.
+    """
+    keys = {_cache_key(artist, title): (artist, title) for artist, title in songs}
+    missing = [k for k in keys if k not in cache]
+    if missing:
+        print(f"Searching Spotify for {len(missing)} tracks ({len(keys) - len(missing)} already resolved)...")
+
+        def search(key):
+            artist, title = keys[key]
+            results = sp.search(q=f"artist:{artist} track:{title}", type="track", limit=1)
+            items = results['tracks']['items']
+            return key, items[0]['uri'] if items else None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(search, key) for key in missing]
+            for done, future in enumerate(tqdm(as_completed(futures), total=len(futures), desc="Resolving tracks"), 1):
+                try:
+                    key, uri = future.result()
+                except Exception as e:
+                    # Left out of the cache so the next run tries again
+                    print(f"\nSearch failed: {e}")
+                    continue
+                cache.put(key, uri)
+                if done % CACHE_SAVE_EVERY == 0:
+                    cache.save()
+        cache.save()
+    return {k: cache.get(k) for k in keys}
+
+def create_playlists(input_filename=RESULTS_PATH, workers=SEARCH_WORKERS):
     """
     Loads classification results from a JSON file and creates the corresponding
     playlists on Spotify.
     """
     # --- AUTHENTICATION (Scope is for creating/modifying playlists) ---
     print("Connecting to Spotify...")
-    sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope="playlist-modify-public", # This scope allows playlist creation
-        requests_timeout=15
-    ))
+    sp = get_spotify()
     user_id = sp.current_user()['id']
     print("Successfully connected to Spotify!")
 
     # --- Load Classification Results ---
-    input_filename = 'classification_results.json'
     print(f"Loading song data from '{input_filename}'...")
     try:
-        with open(input_filename, 'r') as f:
+        with open(input_filename, 'r', encoding='utf-8') as f:
             playlists_to_create = json.load(f)
     except FileNotFoundError:
         print(f"Error: Could not find '{input_filename}'. Please run 'classify_playlist.py' first.")
         return
 
+    # --- Resolve every song without a URI in one concurrent, cached pass ---
+    parsed = {name: [_parse_entry(entry) for entry in tracks] for name, tracks in playlists_to_create.items()}
+    to_search = {(a, t) for entries in parsed.values() for a, t, uri in entries if a and t and not uri}
+    resolved = resolve_tracks(sp, to_search, ResolutionCache(), workers) if to_search else {}
+
     # --- Playlist Creation Loop ---
     print("\n--- Starting Playlist Creation ---")
-    for playlist_name, tracks in playlists_to_create.items():
+    for playlist_name, entries in parsed.items():
         print(f"\nProcessing playlist: '{playlist_name}'...")
 
         new_playlist = sp.user_playlist_create(
@@ -48,28 +181,22 @@ def create_playlists():
             description=f"Songs classified as '{playlist_name}' by my personal ML model on {time.strftime('%Y-%m-%d')}."
         )
         playlist_id = new_playlist['id']
-        
+
         track_uris_to_add = []
-        print(f"Searching for {len(tracks)} tracks on Spotify...")
-        for song_title in tqdm(tracks, desc=f"Finding '{playlist_name}' tracks"):
-            try:
-                artist, track_name = song_title.split(' - ', 1)
-                results = sp.search(q=f"artist:{artist.strip()} track:{track_name.strip()}", type="track", limit=1)
-                if results['tracks']['items']:
-                    uri = results['tracks']['items'][0]['uri']
-                    track_uris_to_add.append(uri)
-            except ValueError:
-                continue
-                
+        for artist, title, uri in entries:
+            if not uri and artist and title:
+                uri = resolved.get(_cache_key(artist, title))
+            if uri:
+                track_uris_to_add.append(uri)
+
         if track_uris_to_add:
-            print(f"Adding {len(track_uris_to_add)} songs to the new playlist...")
-            for i in range(0, len(track_uris_to_add), 100):
-                batch = track_uris_to_add[i:i+100]
-                sp.playlist_add_items(playlist_id, batch)
+            print(f"Adding {len(track_uris_to_add)} of {len(entries)} songs to the new playlist...")
+            for i in range(0, len(track_uris_to_add), SPOTIFY_BATCH_SIZE):
+                sp.playlist_add_items(playlist_id, track_uris_to_add[i:i + SPOTIFY_BATCH_SIZE])
         else:
             print("No tracks were found on Spotify for this category.")
 
     print("\nAll playlists have been created! Check your Spotify account.")
 
 if __name__ == '__main__':
-    create_playlists()
\ No newline at end of file
+    create_playlists()
@@ -1,21 +1,31 @@
 import os
+import json
 import random
 import time
+import threading
 import subprocess
 import tqdm
-import spotipy
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yt_dlp
-from spotipy.oauth2 import SpotifyOAuth
 from yt_dlp.utils import sanitize_filename
 
 # Import credentials from your config file
-from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI, FFMPEG_PATH
+from src.config import FFMPEG_PATH
+from src.spotify_client import get_spotify, all_pages
+from src.rate_limit import TokenBucket
+from src.atomic_io import write_json
 
 # --- CONFIGURATION ---
 OUTPUT_DIR = 'data/library'
 COOKIES_FILE = 'cookies.txt'
 MAX_SONGS_PER_PLAYLIST = 35 
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, 'manifest.json')
+DOWNLOAD_WORKERS = 4
+DOWNLOADS_PER_SECOND = 0.5   # Shared across all workers; halves on every 403/429
 
+# Each playlist is saved to its own subfolder of OUTPUT_DIR, and extract_library
+# labels the files with the folder name: key every playlist by the sort-target
+# playlist its songs belong to, or the key becomes a class of its own
 TRAINING_PLAYLISTS = {
     'shazam-library': 'spotify:playlist:5ph0zF40yAuw05p5PyvHGT'
 }
@@ -23,6 +33,10 @@ TRAINING_PLAYLISTS = {
 def download_via_stream(query, output_path):
     """
     Uses yt-dlp to find the URL and ffmpeg to stream/convert it to MP3.
+    Returns (success, error_message). The MP3 is written to a temp name and
+    only renamed to `output_path` once ffmpeg finishes, so a half-written
+    file never looks like a finished download; a failed run's temp file is
+    removed.
     """
     ydl_opts = {
         'format': 'bestaudio/best',
@@ -31,7 +45,8 @@ def download_via_stream(query, output_path):
         'no_warnings': True,
         'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
     }
-    
+    part_path = output_path + '.part.mp3'
+
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             # 1. Get the direct stream URL
@@ -51,36 +66,126 @@ def download_via_stream(query, output_path):
                 '-codec:a', 'libmp3lame', 
                 '-b:a', '192k', 
                 '-y', # Overwrite if exists
-                output_path
+                part_path
             ]
             
             # We use text=True to capture error messages if it fails
             subprocess.run(cmd, check=True, capture_output=True, text=True)
-            return True
+            os.replace(part_path, output_path)
+            return True, None
             
     except subprocess.CalledProcessError as e:
         print(f"\n[FFmpeg Error] {e.stderr}")
-        return False
+        return False, e.stderr or 'ffmpeg failed'
     except Exception as e:
         if "403" in str(e):
             print(f"\n[!] Access Blocked (403). Your cookies.txt might be expired.")
         else:
             print(f"\n[!] Error finding URL: {e}")
-        return False
+        return False, str(e)
+    finally:
+        # Only left behind when ffmpeg (or the rename) failed
+        if os.path.exists(part_path):
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+
+def is_rate_limited(error):
+    return error is not None and any(code in error for code in ('403', '429', 'Too Many Requests'))
+
+class DownloadManifest:
+    """
+    Resumable record of every track we've tried, saved to data/library/manifest.json.
+    Each entry is 'done', 'failed' or 'in_flight'; anything left 'in_flight'
+    by a crashed run is simply retried next time.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Manifest unreadable, starting fresh: {e}")
+
+    def is_done(self, key):
+        entry = self.entries.get(key)
+        return bool(entry and entry['status'] == 'done' and os.path.exists(entry['file']))
+
+    def mark(self, key, status, file_path, error=None):
+        with self._lock:
+            entry = self.entries.setdefault(key, {'attempts': 0})
+            entry.update({'status': status, 'file': file_path, 'error': error, 'updated': time.time()})
+            if status == 'in_flight':
+                entry['attempts'] += 1
+            self._save()
+
+    def _save(self):
+        write_json(self.path, self.entries)
+
+def _download_track(track, label, manifest, limiter):
+    """
+    Worker: downloads one track into its playlist's folder through the
+    shared rate limiter. Returns 'done', 'skipped' or 'failed'.
+    """
+    artist = track['artists'][0]['name']
+    name = track['name']
+    key = track.get('id') or f"{artist} - {name}"
+
+    safe_name = sanitize_filename(f"{artist} - {name}")
+    file_path = os.path.join(OUTPUT_DIR, label, f"{safe_name}.mp3")
+    flat_path = os.path.join(OUTPUT_DIR, f"{safe_name}.mp3")
+    if not os.path.exists(file_path) and os.path.exists(flat_path):
+        # Saved straight into OUTPUT_DIR by an older run; move it where it gets labelled
+        os.replace(flat_path, file_path)
+        manifest.mark(key, 'done', file_path)
+        return 'skipped'
+    if manifest.is_done(key):
+        return 'skipped'
+    if key not in manifest.entries and os.path.exists(file_path) and os.path.getsize(file_path) > 100000:
+        # Downloaded before the manifest existed; adopt it instead of fetching again
+        manifest.mark(key, 'done', file_path)
+        return 'skipped'
+
+    # IMPROVEMENT: refined search query for better accuracy
+    # Adding "official audio" helps avoid music videos with long intros
+    query = f"ytsearch1:{artist} - {name} official audio"
+
+    limiter.acquire()
+    manifest.mark(key, 'in_flight', file_path)
+    success, error = download_via_stream(query, file_path)
 
-def gather_audio_library():
+    if success:
+        limiter.reward()
+        manifest.mark(key, 'done', file_path)
+        return 'done'
+
+    if is_rate_limited(error):
+        pause = limiter.penalize()
+        print(f"\n[!] Rate limited, all workers backing off for {pause:.0f}s")
+    manifest.mark(key, 'failed', file_path, error=(error or '')[:500])
+    print(f"Failed to download: {name}")
+    return 'failed'
+
+def gather_audio_library(workers=DOWNLOAD_WORKERS, rate=DOWNLOADS_PER_SECOND):
+    """
+    Downloads every training playlist into its own data/library/<label>
+    folder with `workers` concurrent downloads sharing one token-bucket
+    rate limiter.
+    """
     # 1. Setup Directories
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
+    manifest = DownloadManifest()
+    limiter = TokenBucket(rate, capacity=workers)
 
     # 2. Connect to Spotify
     print("Connecting to Spotify...")
-    sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope="playlist-read-private"
-    ))
+    sp = get_spotify()
     print("Connected.")
 
     # 3. Iterate Playlists
@@ -88,11 +193,7 @@ def gather_audio_library():
         print(f"\n--- Processing Playlist: '{label}' ---")
         
         try:
-            results = sp.playlist_items(playlist_id)
-            items = results['items']
-            while results['next']:
-                results = sp.next(results)
-                items.extend(results['items'])
+            items = all_pages(sp, sp.playlist_items(playlist_id))
         except Exception as e:
             print(f"Could not fetch playlist '{label}': {e}")
             continue
@@ -101,38 +202,24 @@ def gather_audio_library():
             random.seed(42)
             items = random.sample(items, MAX_SONGS_PER_PLAYLIST)
 
-        for item in tqdm.tqdm(items, desc=f"Downloading {label}"):
-            try:
-                track = item.get('track')
-                if not track or not track.get('artists'): continue
-
-                artist = track['artists'][0]['name']
-                name = track['name']
+        tracks = [item['track'] for item in items if item.get('track') and item['track'].get('artists')]
+        os.makedirs(os.path.join(OUTPUT_DIR, label), exist_ok=True)
+        counts = {'done': 0, 'skipped': 0, 'failed': 0}
+        start = time.monotonic()
 
-                safe_name = sanitize_filename(f"{artist} - {name}")
-                file_path = os.path.join(OUTPUT_DIR, f"{safe_name}.mp3")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_download_track, track, label, manifest, limiter) for track in tracks]
+            for future in tqdm.tqdm(as_completed(futures), total=len(futures), desc=f"Downloading {label}"):
+                try:
+                    counts[future.result()] += 1
+                except Exception as e:
+                    print(f"Error processing item: {e}")
+                    counts['failed'] += 1
 
-                if os.path.exists(file_path):
-                    # Check file size to ensure previous download wasn't a 0kb error
-                    if os.path.getsize(file_path) > 100000: 
-                        continue
-                    else:
-                        os.remove(file_path) # Delete corrupted file
-
-                # IMPROVEMENT: refined search query for better accuracy
-                # Adding "official audio" helps avoid music videos with long intros
-                query = f"ytsearch1:{artist} - {name} official audio"
-                
-                success = download_via_stream(query, file_path)
-                
-                if success:
-                    time.sleep(random.uniform(1.0, 3.0))
-                else:
-                    print(f"Failed to download: {name}")
-
-            except Exception as e:
-                print(f"Error processing item: {e}")
-                continue
+        elapsed = time.monotonic() - start
+        per_minute = counts['done'] / elapsed * 60 if elapsed else 0.0
+        print(f"'{label}': {counts['done']} downloaded, {counts['skipped']} already done, "
+              f"{counts['failed']} failed in {elapsed:.0f}s ({per_minute:.1f} tracks/min)")
 
 if __name__ == '__main__':
     gather_audio_library()
\ No newline at end of file
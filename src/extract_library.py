@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import tqdm
+
+from src.feature_extraction import decode_audio, extract_features_from_decoded, AST_BATCH_SIZE
+from src.feature_store import get_feature_store
+
+# --- CONFIGURATION ---
+LIBRARY_DIR = os.path.join('data', 'library')
+MANIFEST_FILE = 'manifest.json'   # Written by download_library.py; maps Spotify IDs to files
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.flac', '.wav', '.ogg', '.opus', '.aac')
+EXTRACT_WORKERS = os.cpu_count() or 1
+TORCH_THREADS_PER_WORKER = 1      # One intra-op thread per process, so the workers don't fight over cores
+WRITE_BATCH_ROWS = 100            # Feature rows buffered before one store append
+
+_TRACK_NUMBER = re.compile(r'^\d{1,3}\s*[-._)]\s*')
+_SPOTIFY_ID = re.compile(r'^[0-9A-Za-z]{22}$')
+
+
+def parse_filename(path):
+    """
+    Returns (artist, title) from an "Artist - Title.mp3" file name, the
+    format download_library.py writes. A leading track number is ignored;
+    names without " - " give an empty artist and the whole name as title.
+    """
+    stem = _TRACK_NUMBER.sub('', os.path.splitext(os.path.basename(path))[0]).strip()
+    artist, sep, title = stem.partition(' - ')
+    if not sep:
+        return '', stem
+    return artist.strip(), title.strip()
+
+
+def _manifest_track_ids(directory):
+    """{absolute file path: Spotify track ID} from download_library's manifest, if there is one."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Manifest unreadable, track IDs won't be recorded: {e}")
+        return {}
+    return {
+        os.path.abspath(entry['file']): key
+        for key, entry in entries.items()
+        if _SPOTIFY_ID.match(key) and entry.get('file')
+    }
+
+
+def scan_library(directory=LIBRARY_DIR, label=None):
+    """
+    Lists every audio file under `directory` as a dict with path, artist,
+    title, label and track_id, sorted by path. Files in a subfolder are
+    labelled with the subfolder's name, the rest with `label`. Without a
+    `label` those top-level files are left out: every stored row is a
+    training example, and a made-up class would be learned as a real one.
+    """
+    track_ids = _manifest_track_ids(directory)
+    songs = []
+    for root, _, files in os.walk(directory):
+        rel = os.path.relpath(root, directory)
+        folder_label = label if rel == '.' else rel.split(os.sep)[0]
+        if not folder_label:
+            continue
+        for name in files:
+            if not name.lower().endswith(AUDIO_EXTENSIONS) or '.part.' in name:
+                continue
+            path = os.path.join(root, name)
+            artist, title = parse_filename(path)
+            songs.append({
+                'path': path,
+                'artist': artist,
+                'title': title,
+                'label': folder_label,
+                'track_id': track_ids.get(os.path.abspath(path)),
+            })
+    songs.sort(key=lambda s: s['path'])
+    return songs
+
+
+# --- Worker process ---
+def _init_worker(torch_threads):
+    """Runs once per worker: pins torch's threads and loads the AST a single time."""
+    from src import model_registry
+    model_registry.AST_THREADS = torch_threads
+    model_registry.get_ast_model()
+
+
+def _extract_chunk(songs, batch_size):
+    """Decodes a chunk of local files and runs the AST over them in batches. Returns (song, features or None) pairs."""
+    decoded = [decode_audio(song['path'], song['title'], keep_file=True) for song in songs]
+    return list(zip(songs, extract_features_from_decoded(decoded, batch_size=batch_size)))
+
+
+def extract_library(directory=LIBRARY_DIR, label=None, workers=EXTRACT_WORKERS,
+                    batch_size=AST_BATCH_SIZE, torch_threads=TORCH_THREADS_PER_WORKER,
+                    write_batch=WRITE_BATCH_ROWS, limit=None):
+    """
+    Featurizes every audio file in `directory` into the feature store, with
+    the same librosa + AST features as the download path and without
+    touching the files.
+
+    Files are split into chunks of `batch_size` and spread over `workers`
+    processes. Each process loads the AST once and runs one forward pass per
+    chunk, with `torch_threads` torch threads, so throughput grows with the
+    number of cores instead of the workers competing for them. Rows go to the
+    store from this process every `write_batch` songs. Songs whose (artist,
+    track, label) is already stored are skipped, so an interrupted run
+    continues where it stopped. Returns a dict of counts.
+    """
+    if not os.path.isdir(directory):
+        print(f"Error: '{directory}' is not a directory.")
+        return None
+
+    store = get_feature_store()
+    done = store.labeled_keys()
+    songs = scan_library(directory, label)
+    if not label and any(name.lower().endswith(AUDIO_EXTENSIONS) for name in os.listdir(directory)):
+        print(f"Skipping the files directly in '{directory}': pass --label to say which playlist they belong to.")
+    pending = [s for s in songs if (s['artist'], s['title'], s['label']) not in done]
+    if limit:
+        pending = pending[:limit]
+    stats = {'found': len(songs), 'skipped': len(songs) - len(pending), 'extracted': 0, 'failed': 0}
+    print(f"Found {len(songs)} audio files, {stats['skipped']} already in the feature store.")
+    if not pending:
+        return stats
+
+    workers = max(1, min(workers, -(-len(pending) // batch_size)))
+    chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    print(f"Extracting {len(pending)} songs in {len(chunks)} chunks on {workers} worker processes...")
+
+    buffer = []
+    start = time.perf_counter()
+
+    def flush():
+        store.append(buffer, skip_existing=True)
+        buffer.clear()
+
+    # spawn: torch and its thread pools don't survive a fork reliably
+    context = multiprocessing.get_context('spawn')
+    progress = tqdm.tqdm(total=len(pending), desc="Extracting library")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(torch_threads,)) as pool:
+            futures = {pool.submit(_extract_chunk, chunk, batch_size): len(chunk) for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"\nChunk failed: {e}")
+                    progress.update(futures[future])
+                    continue
+                for song, features in results:
+                    progress.update(1)
+                    if not features:
+                        continue
+                    features.update({'artist': song['artist'], 'track': song['title'],
+                                     'label': song['label'], 'track_id': song['track_id']})
+                    buffer.append(features)
+                    stats['extracted'] += 1
+                    if len(buffer) >= write_batch:
+                        flush()
+    finally:
+        # Whatever finished is kept even if the run is interrupted
+        flush()
+        progress.close()
+
+    stats['failed'] = len(pending) - stats['extracted']
+    stats['seconds'] = round(time.perf_counter() - start, 2)
+    per_minute = stats['extracted'] / stats['seconds'] * 60 if stats['seconds'] else 0.0
+    print(f"Extracted {stats['extracted']} songs ({stats['failed']} failed) in {stats['seconds']}s "
+          f"({per_minute:.1f} songs/min).")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract features for a directory of local audio files into the feature store.")
+    parser.add_argument('directory', nargs='?', default=LIBRARY_DIR)
+    parser.add_argument('--label', default=None,
+                        help="Playlist label for files not inside a subfolder (they are skipped without one)")
+    parser.add_argument('--workers', type=int, default=EXTRACT_WORKERS, help="Worker processes (default: one per core)")
+    parser.add_argument('--batch-size', type=int, default=AST_BATCH_SIZE, help="Songs per AST forward pass")
+    parser.add_argument('--torch-threads', type=int, default=TORCH_THREADS_PER_WORKER)
+    parser.add_argument('--limit', type=int, default=None, help="Only extract this many new songs")
+    args = parser.parse_args()
+    extract_library(args.directory, args.label, args.workers, args.batch_size, args.torch_threads, limit=args.limit)
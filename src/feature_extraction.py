@@ -1,21 +1,127 @@
-import yt_dlp
 import os
 import numpy as np
-import librosa
-import torch
-from transformers import AutoProcessor, AutoModelForAudioClassification
 from yt_dlp.utils import sanitize_filename
 
-# --- Model Loading (Done once) ---
-print("Loading Audio Classification Model...")
-processor = AutoProcessor.from_pretrained("MIT/ast-finetuned-audioset-10-10-0.4593", use_fast=True)
-model = AutoModelForAudioClassification.from_pretrained("MIT/ast-finetuned-audioset-10-10-0.4593")
-print("Model loaded.")
+from src.model_registry import get_ast_model
+from src.audio_source import resolve_stream, stream_pcm
+from src.audio_cache import get_audio_cache
+from src import metrics
 
-def process_and_extract_features(artist, title):
+# librosa, torch and transformers are imported inside the functions that use
+# them, so importing this module (and therefore the web app) stays cheap.
+
+AST_SAMPLE_RATE = 16000
+AST_BATCH_SIZE = 8
+LIBROSA_SAMPLE_RATE = 22050
+AST_DURATION = 120       # Seconds of audio the AST sees
+LIBROSA_DURATION = 60    # Seconds of audio the librosa features see
+
+# 'stream' pipes the YouTube stream through ffmpeg straight into memory and only
+# falls back to a temp-file download when that fails; 'disk' always downloads.
+ACQUISITION_MODE = 'stream'
+
+# --- ANALYSIS WINDOW ---
+# By default we analyse the first AST_DURATION seconds of every song. Set
+# ANALYSIS_RANGE = (start_seconds, length_seconds) to fetch one fixed range,
+# or ANALYSIS_SEGMENTS = (count, length_seconds) to fetch `count` short
+# windows spread evenly across the song, e.g. (1, 30) is 30s from the middle.
+# Only those ranges are requested from the stream (ffmpeg input seeking).
+ANALYSIS_RANGE = None
+ANALYSIS_SEGMENTS = None
+
+def plan_segments(track_duration=None):
+    """Returns the (offset, length) windows to fetch for a song of `track_duration` seconds."""
+    if ANALYSIS_SEGMENTS and track_duration:
+        count, length = ANALYSIS_SEGMENTS
+        length = min(length, track_duration / count)
+        # Centre window i at (i + 1) / (count + 1) of the song
+        return [(max(0.0, track_duration * (i + 1) / (count + 1) - length / 2), length) for i in range(count)]
+    if ANALYSIS_RANGE:
+        return [ANALYSIS_RANGE]
+    if ANALYSIS_SEGMENTS:
+        # Unknown duration: take the requested amount of audio from the start
+        count, length = ANALYSIS_SEGMENTS
+        return [(0.0, count * length)]
+    return [(0.0, AST_DURATION)]
+
+def window_signature():
+    """Identifies the analysis window, so cached audio of a different window is never reused."""
+    if ANALYSIS_SEGMENTS:
+        return f"segments:{ANALYSIS_SEGMENTS[0]}x{ANALYSIS_SEGMENTS[1]}"
+    if ANALYSIS_RANGE:
+        return f"range:{ANALYSIS_RANGE[0]}+{ANALYSIS_RANGE[1]}"
+    return None
+
+def extract_ast_features_batch(clips, sampling_rate=AST_SAMPLE_RATE, batch_size=AST_BATCH_SIZE, mode=None, compile_mode=None):
     """
-    Downloads a song and extracts full features (Librosa + AST).
+    Runs the AST model over many decoded clips at once. The processor pads each
+    batch to a fixed-size spectrogram tensor, so we pay one forward pass per
+    `batch_size` songs instead of one per song.
+    Returns one {label: probability} dict per clip, in input order.
+    `mode` and `compile_mode` pick the AST inference mode (see
+    model_registry); by default AST_INFERENCE_MODE and AST_COMPILE apply.
     """
+    import torch
+    processor, model = get_ast_model(mode, compile_mode)
+
+    results = []
+    for start in range(0, len(clips), batch_size):
+        batch = clips[start:start + batch_size]
+        inputs = processor(batch, sampling_rate=sampling_rate, return_tensors="pt")
+        with torch.no_grad(), metrics.timed('ast_forward'):
+            logits = model(inputs['input_values']).logits
+        probabilities = torch.sigmoid(logits).numpy()
+        for row in probabilities:
+            results.append({model.config.id2label[i]: float(row[i]) for i in range(len(row))})
+    return results
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+def extract_librosa_features(y, sr):
+    """
+    Computes the hand-crafted librosa features from a mono clip (first 60s).
+
+    One STFT is computed and its magnitude feeds the spectral centroid and
+    bandwidth; its power feeds the single mel spectrogram that both the MFCCs
+    and the tempo onset envelope are derived from. The parameters match
+    librosa's defaults, so the values (and column names) are the same as
+    calling each feature on `y` separately.
+    """
+    import librosa
+    y = y[:int(LIBROSA_DURATION * sr)]
+    lib_features = {}
+
+    # --- Shared transforms ---
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    log_mel = librosa.power_to_db(mel)
+
+    onset_env = librosa.onset.onset_strength(S=log_mel, sr=sr, hop_length=HOP_LENGTH, aggregate=np.median)
+    lib_features['tempo'] = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH)[0]
+    
+    # RMS stays in the time domain: the STFT-based estimate is windowed and
+    # would not match the values the model was trained on
+    rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    lib_features['rms_mean'], lib_features['rms_std'] = np.mean(rms), np.std(rms)
+    
+    spec_cent = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    lib_features['spectral_centroid_mean'], lib_features['spectral_centroid_std'] = np.mean(spec_cent), np.std(spec_cent)
+    
+    spec_bw = librosa.feature.spectral_bandwidth(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    lib_features['spectral_bandwidth_mean'], lib_features['spectral_bandwidth_std'] = np.mean(spec_bw), np.std(spec_bw)
+    
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    lib_features['zero_crossing_rate_mean'], lib_features['zero_crossing_rate_std'] = np.mean(zcr), np.std(zcr)
+    
+    mfccs = librosa.feature.mfcc(S=log_mel, n_mfcc=20)
+    for i in range(20):
+        lib_features[f'mfcc_{i+1}_mean'] = np.mean(mfccs[i])
+        lib_features[f'mfcc_{i+1}_std'] = np.std(mfccs[i])
+
+    return lib_features
+
+def _temp_path_for(artist, title):
     safe_title = sanitize_filename(f"{artist} - {title}")[:150]
     
     # --- ROUTE TO SPECIFIC FOLDER ---
@@ -26,60 +132,199 @@ def process_and_extract_features(artist, title):
     os.makedirs(temp_dir, exist_ok=True) 
     
     # Final path: data/audio/temp_classification/SongName.mp3
-    temp_path = os.path.join(temp_dir, f"{safe_title}.mp3")
-    # --------------------------------
+    return os.path.join(temp_dir, f"{safe_title}.mp3")
+
+def download_audio(artist, title):
+    """Downloads a song to the temp folder. Returns the file path or None."""
+    temp_path = _temp_path_for(artist, title)
     
     # 1. Download via yt-dlp to disk
     success = _download_to_disk(f"ytsearch1:{artist} {title}", temp_path)
-    
-    if not success:
+    return temp_path if success else None
+
+def acquire_audio(artist, title, track_id=None, timings=None):
+    """
+    Gets a song's audio for feature extraction as a (segments, sample_rate)
+    tuple, where segments is a list of sample arrays, one per analysis
+    window. The local audio cache is checked first by Spotify ID and name,
+    then again by YouTube video ID once the search is resolved. On a miss,
+    'stream' mode pipes only the analysis windows through ffmpeg straight
+    into memory and caches them. Fresh audio is returned the way the cache
+    stores it (rounded to float16), so a song gets the same features
+    whether or not it was cached.
+    Sources that can't be streamed (or every source, in 'disk' mode) are
+    downloaded to a temp file instead; its analysis windows are decoded,
+    cached the same way and the file deleted, so the slow download happens
+    only once. If that decode fails the file's path is returned for
+    decode_audio to report. Returns None if everything fails.
+    Stage timings are added to the `timings` dict when one is given.
+    """
+    cache = get_audio_cache()
+    variant = window_signature()
+    info = None
+    cached = cache.get(artist=artist, title=title, spotify_id=track_id, variant=variant)
+    if cached is not None:
+        metrics.inc('audio_cache_total', result='hit')
+        return cached
+
+    if ACQUISITION_MODE == 'stream':
+        with metrics.timed('resolve', into=timings):
+            info = resolve_stream(f"ytsearch1:{artist} {title}")
+        if info is not None:
+            cached = cache.get(video_id=info['id'], variant=variant)
+            if cached is not None:
+                metrics.inc('audio_cache_total', result='hit')
+                return cached
+            metrics.inc('audio_cache_total', result='miss')
+
+            segments = []
+            with metrics.timed('stream', into=timings):
+                for offset, length in plan_segments(info.get('duration')):
+                    pcm = stream_pcm(info, LIBROSA_SAMPLE_RATE, duration=length, offset=offset)
+                    if pcm is None:
+                        segments = []
+                        break
+                    segments.append(pcm)
+            if segments:
+                # What the cache hands back: a later hit must give the same features
+                segments = cache.put(info['id'], segments, LIBROSA_SAMPLE_RATE, artist=artist, title=title,
+                                     spotify_id=track_id, variant=variant)
+                return segments, LIBROSA_SAMPLE_RATE
+        else:
+            metrics.inc('audio_cache_total', result='miss')
+        metrics.inc('download_failures_total', reason='stream')
+        print(f"-> Streaming failed for {title}, falling back to a disk download")
+    else:
+        metrics.inc('audio_cache_total', result='miss')
+
+    with metrics.timed('download', into=timings):
+        path = download_audio(artist, title)
+    if path is None:
+        metrics.inc('download_failures_total', reason='download')
         return None
 
     try:
-        # 2. AST Model Features (Sampling rate 16k)
-        # We limit duration during load to save memory/processing time, similar to the old -t 120 flag
-        y_ast, sr_ast = librosa.load(temp_path, sr=16000, duration=120) 
-        inputs = processor(y_ast, sampling_rate=sr_ast, return_tensors="pt")
-        with torch.no_grad():
-            logits = model(**inputs).logits
-        probabilities = torch.sigmoid(logits[0])
-        ast_features = {model.config.id2label[i]: probabilities[i].item() for i in range(len(probabilities))}
+        with metrics.timed('decode', into=timings):
+            segments = [seg for seg in _load_segments(path) if len(seg)]
+    except Exception as e:
+        print(f"-> Could not decode the download of {title} for caching: {e}")
+        return path
+    if not segments:
+        return path
+    # Without a resolved stream there is no video ID; key on the song instead
+    video_id = info['id'] if info else f"download:{track_id or f'{artist} - {title}'}"
+    segments = cache.put(video_id, segments, LIBROSA_SAMPLE_RATE, artist=artist, title=title,
+                         spotify_id=track_id, variant=variant)
+    os.remove(path)
+    return segments, LIBROSA_SAMPLE_RATE
+
+def _load_segments(path):
+    """Decodes just the analysis windows of a downloaded file."""
+    import librosa
+    duration = librosa.get_duration(path=path)
+    return [
+        librosa.load(path, sr=LIBROSA_SAMPLE_RATE, mono=True, offset=offset, duration=length)[0]
+        for offset, length in plan_segments(duration)
+    ]
+
+def decode_audio(source, title='', timings=None, keep_file=False):
+    """
+    Turns acquired audio (a (segments, sample_rate) tuple or a downloaded
+    file, which is deleted afterwards unless `keep_file` is set) into what
+    the feature extractors need.
+    Returns (ast_clips, librosa_features) or None. There is one AST clip per
+    analysis window; the librosa features are computed over all windows
+    joined end to end.
+    """
+    if source is None:
+        return None
+
+    import librosa
+    temp_path = source if isinstance(source, str) else None
+    try:
+        with metrics.timed('decode', into=timings):
+            if temp_path:
+                # Decode once, at the librosa rate, only the windows we analyse
+                segments, sr = _load_segments(temp_path), LIBROSA_SAMPLE_RATE
+            else:
+                segments, sr = source
+            segments = [seg for seg in segments if len(seg)]
+            if not segments:
+                raise ValueError("no audio decoded")
+
+            # 2. AST input clips (Sampling rate 16k), resampled from the in-memory buffers
+            ast_clips = [librosa.resample(seg, orig_sr=sr, target_sr=AST_SAMPLE_RATE) for seg in segments]
 
         # 3. Full Librosa Features
-        y, sr = librosa.load(temp_path, mono=True, duration=60)
-        lib_features = {}
-        
-        lib_features['tempo'] = librosa.feature.tempo(y=y, sr=sr)[0]
-        
-        rms = librosa.feature.rms(y=y)
-        lib_features['rms_mean'], lib_features['rms_std'] = np.mean(rms), np.std(rms)
-        
-        spec_cent = librosa.feature.spectral_centroid(y=y, sr=sr)
-        lib_features['spectral_centroid_mean'], lib_features['spectral_centroid_std'] = np.mean(spec_cent), np.std(spec_cent)
-        
-        spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-        lib_features['spectral_bandwidth_mean'], lib_features['spectral_bandwidth_std'] = np.mean(spec_bw), np.std(spec_bw)
-        
-        zcr = librosa.feature.zero_crossing_rate(y)
-        lib_features['zero_crossing_rate_mean'], lib_features['zero_crossing_rate_std'] = np.mean(zcr), np.std(zcr)
-        
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-        for i in range(20):
-            lib_features[f'mfcc_{i+1}_mean'] = np.mean(mfccs[i])
-            lib_features[f'mfcc_{i+1}_std'] = np.std(mfccs[i])
+        with metrics.timed('librosa_features', into=timings):
+            lib_features = extract_librosa_features(np.concatenate(segments), sr)
+        return ast_clips, lib_features
 
+    except Exception as e:
+        metrics.inc('extraction_failures_total', step='decode')
+        print(f"-> Extraction error for {title or temp_path}: {e}")
+        return None
+    finally:
         # Cleanup
-        if os.path.exists(temp_path):
+        if temp_path and not keep_file and os.path.exists(temp_path):
             os.remove(temp_path)
-            
-        return {**lib_features, **ast_features}
 
+def download_and_decode(artist, title, track_id=None):
+    """
+    Acquires a song and decodes everything the feature extractors need.
+    Returns (ast_clips, librosa_features), with one AST clip per analysis
+    window, or None if any step fails.
+    """
+    return decode_audio(acquire_audio(artist, title, track_id), title)
+
+def extract_features_from_decoded(decoded, batch_size=AST_BATCH_SIZE):
+    """
+    Takes a list of download_and_decode() results (None entries allowed) and
+    returns the matching list of full feature dicts, batching the AST pass.
+    Songs analysed in several windows get the mean AST probability over them.
+    """
+    ready = [i for i, d in enumerate(decoded) if d is not None]
+    results = [None] * len(decoded)
+    if not ready:
+        return results
+
+    clips, owners = [], []
+    for i in ready:
+        clips.extend(decoded[i][0])
+        owners.extend([i] * len(decoded[i][0]))
+
+    try:
+        ast_features = extract_ast_features_batch(clips, batch_size=batch_size)
     except Exception as e:
-        print(f"-> Extraction error for {title}: {e}")
-        if os.path.exists(temp_path): os.remove(temp_path)
-        return None
+        metrics.inc('extraction_failures_total', amount=len(ready), step='ast')
+        print(f"-> AST batch error: {e}")
+        return results
+
+    per_song = {}
+    for i, ast in zip(owners, ast_features):
+        per_song.setdefault(i, []).append(ast)
+    for i, windows in per_song.items():
+        ast = {label: float(np.mean([w[label] for w in windows])) for label in windows[0]}
+        results[i] = {**decoded[i][1], **ast}
+    return results
+
+def process_and_extract_features_batch(tracks, batch_size=AST_BATCH_SIZE):
+    """
+    Downloads and extracts full features (Librosa + AST) for a list of
+    (artist, title) or (artist, title, track_id) tuples. Returns feature
+    dicts aligned with `tracks`, with None for songs that failed.
+    """
+    decoded = [download_and_decode(*track) for track in tracks]
+    return extract_features_from_decoded(decoded, batch_size=batch_size)
+
+def process_and_extract_features(artist, title):
+    """
+    Downloads a song and extracts full features (Librosa + AST).
+    """
+    return process_and_extract_features_batch([(artist, title)])[0]
 
 def _download_to_disk(query, output_path):
+    import yt_dlp
     base_path = output_path.rsplit('.mp3', 1)[0]
     
     ydl_opts = {
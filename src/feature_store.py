@@ -0,0 +1,467 @@
+import os
+import glob
+import json
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+
+from src.atomic_io import atomic_open, write_json
+
+# --- CONFIGURATION ---
+STORE_DIR = os.path.join('data', 'feature_store')
+LEGACY_CSV_PATH = 'training_features.csv'
+META_COLUMNS = ['artist', 'track', 'label', 'track_id']
+SEQ_COLUMN = 'seq'         # Per-row append key stored in every segment; rows load sorted by it
+MERGE_FACTOR = 8           # Trailing segments piled up before they are merged into one
+MIGRATION_CHUNK_ROWS = 5000
+LOCK_FILE = '.merge.lock'  # Held while segments are merged or deleted, across processes
+LOCK_STALE_SECONDS = 300   # A lock older than this was left by a crashed process
+MIGRATION_FILE = 'migration.json'
+
+
+class FeatureStore:
+    """
+    Columnar, append-only store for extracted song features.
+
+    Every append is written as one compressed .npz segment holding a float32
+    feature matrix plus the artist/track/label/track_id metadata columns.
+    On load all segments are read once and two hash indexes are built, so a
+    cache check is an O(1) dict lookup by Spotify track ID, falling back to
+    the (artist, track) pair for rows that were saved without an ID.
+
+    Every row carries a sequence key made of its segment's creation time, pid,
+    a random suffix and its index in the batch. Keys never change, not even
+    when segments are merged, and rows always load sorted by them, so several
+    processes can append at once and a reload still sees every row in append
+    order. `seqs` doubles as a stable row identity for anything that has to
+    remember rows across reloads.
+
+    Recent segments are merged like a binary counter: a trailing run of at
+    least MERGE_FACTOR segments is merged once its first segment holds no
+    more rows than the rest of the run. Each merge at least doubles the
+    segment it starts from, so a row is rewritten O(log n) times and the
+    store stays at O(log n) segments.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        self.columns = []        # Global feature column order (first seen wins)
+        self._col_index = {}
+        self._blocks = []        # One float32 matrix per segment
+        self._block_cols = []    # Global column index for each block column
+        self._segments = []      # Segment file backing each block
+        self._block_rows = []    # Store row number of every row in each block
+        self._rows = []          # (block, row) position of every stored row
+        self.artists, self.tracks, self.labels, self.track_ids = [], [], [], []
+        self.seqs = []           # Sequence key of every row
+        self._last_ns = 0
+        self._by_id = {}
+        self._by_name = {}
+        self._labeled = set()    # (artist, track, label) of every row
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+    # --- Loading ---
+    def _load(self):
+        metas = []
+        # Holding the merge lock means no merge swaps files while we list and read them
+        with _DirectoryLock(self.root, blocking=True):
+            for path in sorted(glob.glob(os.path.join(self.root, 'seg-*.npz'))):
+                with np.load(path) as data:
+                    meta = {col: [str(v) for v in data[col]] for col in META_COLUMNS + [SEQ_COLUMN]}
+                    self._add_block([str(c) for c in data['columns']], data['values'].astype(np.float32, copy=False), path)
+                    metas.append(meta)
+
+        # A merged segment can hold rows appended on both sides of another
+        # process's rows, so the order comes from the keys, not the files
+        order = sorted((seq, block, i) for block, meta in enumerate(metas) for i, seq in enumerate(meta[SEQ_COLUMN]))
+        for _, block, i in order:
+            self._add_row(block, i, metas[block])
+
+    def _add_block(self, columns, values, path):
+        for col in columns:
+            if col not in self._col_index:
+                self._col_index[col] = len(self.columns)
+                self.columns.append(col)
+
+        self._blocks.append(values)
+        self._block_cols.append(np.array([self._col_index[c] for c in columns], dtype=np.int64))
+        self._segments.append(path)
+        self._block_rows.append([])
+        return len(self._blocks) - 1
+
+    def _add_row(self, block, i, meta):
+        row = len(self._rows)
+        self._rows.append((block, i))
+        self._block_rows[block].append(row)
+        artist, track = meta['artist'][i], meta['track'][i]
+        track_id = meta['track_id'][i]
+        self.artists.append(artist)
+        self.tracks.append(track)
+        self.labels.append(meta['label'][i])
+        self.track_ids.append(track_id)
+        self.seqs.append(meta[SEQ_COLUMN][i])
+        if track_id:
+            self._by_id[track_id] = row
+        self._by_name[(artist, track)] = row
+        self._labeled.add((artist, track, self.labels[-1]))
+
+    # --- Lookup ---
+    def find_row(self, track_id=None, artist=None, track=None):
+        """Returns the row number for a track, or None if we have never seen it."""
+        with self._lock:
+            if track_id and track_id in self._by_id:
+                return self._by_id[track_id]
+            return self._by_name.get((artist, track))
+
+    def row_features(self, row):
+        """Returns the feature dict for a row. Columns the row never had are NaN."""
+        with self._lock:
+            block, i = self._rows[row]
+            features = dict.fromkeys(self.columns, np.nan)
+            for col_idx, value in zip(self._block_cols[block], self._blocks[block][i]):
+                features[self.columns[col_idx]] = float(value)
+            return features
+
+    def contains(self, artist, track, track_id=None):
+        return self.find_row(track_id, artist, track) is not None
+
+    def labeled_keys(self):
+        """Returns every stored (artist, track, label) triple."""
+        with self._lock:
+            return set(self._labeled)
+
+    # --- Writing ---
+    def append(self, rows, skip_existing=False):
+        """
+        Appends a batch of rows as a single segment. Each row is a dict of
+        features plus 'artist', 'track', 'label' and optionally 'track_id'.
+        With `skip_existing`, rows whose (artist, track, label) is already
+        stored (or repeated within the batch) are dropped, which makes
+        replaying a batch after a crash harmless.
+        """
+        with self._lock:
+            rows = [r for r in rows if r]
+            if skip_existing:
+                unique, seen = [], set()
+                for r in rows:
+                    key = (str(r.get('artist') or ''), str(r.get('track') or ''), str(r.get('label') or ''))
+                    if key not in self._labeled and key not in seen:
+                        seen.add(key)
+                        unique.append(r)
+                rows = unique
+            if not rows:
+                return 0
+
+            columns = []
+            seen = set()
+            for r in rows:
+                for key in r:
+                    if key not in META_COLUMNS and key not in seen:
+                        seen.add(key)
+                        columns.append(key)
+
+            values = np.full((len(rows), len(columns)), np.nan, dtype=np.float32)
+            for i, r in enumerate(rows):
+                for j, col in enumerate(columns):
+                    v = r.get(col)
+                    if v is not None:
+                        values[i, j] = v
+            meta = {col: [str(r.get(col) or '') for r in rows] for col in META_COLUMNS}
+            name = self._segment_name()
+            meta[SEQ_COLUMN] = _seq_keys(name, len(rows))
+
+            path = self._write_segment(columns, values, meta, name)
+            block = self._add_block(columns, values, path)
+            for i in range(len(rows)):
+                self._add_row(block, i, meta)
+            self._merge_tail()
+            return len(rows)
+
+    def _segment_name(self):
+        # Never goes backwards within a process, even if the wall clock does
+        self._last_ns = max(time.time_ns(), self._last_ns + 1)
+        return f"{self._last_ns:020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _write_segment(self, columns, values, meta, name):
+        path = os.path.join(self.root, f"seg-{name}.npz")
+
+        # Written under a temp name first so a crash never leaves a half-written segment
+        with atomic_open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                columns=np.array(columns, dtype=str),
+                values=values,
+                **{col: np.array(meta[col], dtype=str) for col in META_COLUMNS + [SEQ_COLUMN]}
+            )
+        return path
+
+    # --- Merging ---
+    def _merge_tail(self):
+        """Merges the longest trailing run whose first segment is no bigger than the rest of it."""
+        start, after = None, 0
+        for i in range(len(self._blocks) - 1, -1, -1):
+            if len(self._blocks[i]) <= after:
+                start = i
+            after += len(self._blocks[i])
+        if start is not None and len(self._blocks) - start >= MERGE_FACTOR:
+            self._merge_blocks(start)
+
+    def compact(self):
+        """Merges all segments into one so loading stays a handful of reads."""
+        with self._lock:
+            if len(self._segments) > 1:
+                self._merge_blocks(0)
+
+    def _merge_blocks(self, start):
+        """
+        Rewrites blocks `start`..end as one segment. Only trailing blocks are
+        merged, so no later block is renumbered, and no row number or
+        sequence key changes. Returns False if another process holds the
+        merge lock or already merged some of these files.
+        """
+        with _DirectoryLock(self.root, blocking=False) as lock:
+            if not lock.acquired:
+                return False
+            old_segments = self._segments[start:]
+            if not all(os.path.exists(p) for p in old_segments):
+                return False
+
+            # After a reload these blocks' rows can be interleaved with older blocks'
+            rows = sorted(row for block_rows in self._block_rows[start:] for row in block_rows)
+            col_idx = sorted(set().union(*(set(c.tolist()) for c in self._block_cols[start:])))
+            columns = [self.columns[i] for i in col_idx]
+            values = self.rows_matrix(rows, columns)
+            meta = {
+                col: [column[row] for row in rows]
+                for col, column in (('artist', self.artists), ('track', self.tracks), ('label', self.labels),
+                                     ('track_id', self.track_ids), (SEQ_COLUMN, self.seqs))
+            }
+            path = self._write_segment(columns, values, meta, self._segment_name())
+            for p in old_segments:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+
+            del self._blocks[start:], self._block_cols[start:], self._segments[start:], self._block_rows[start:]
+            self._blocks.append(values)
+            self._block_cols.append(np.array(col_idx, dtype=np.int64))
+            self._segments.append(path)
+            self._block_rows.append(rows)
+            for i, row in enumerate(rows):
+                self._rows[row] = (start, i)
+            return True
+
+    def fingerprint(self):
+        """Returns a string that changes whenever the stored data changes."""
+        with self._lock:
+            parts = []
+            for path in self._segments:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Merged away by another process; our rows are still in memory
+                    parts.append(f"{os.path.basename(path)}:gone")
+                    continue
+                parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+            return '|'.join(parts)
+
+    # --- Bulk access ---
+    def matrix(self, columns=None):
+        """Returns every row as one float32 matrix over `columns` (default: all)."""
+        with self._lock:
+            columns = self.columns if columns is None else columns
+            position = {c: j for j, c in enumerate(columns)}
+            out = np.full((len(self._rows), len(columns)), np.nan, dtype=np.float32)
+            start = 0
+            for block, block_cols in zip(self._blocks, self._block_cols):
+                src, dst = [], []
+                for j, col_idx in enumerate(block_cols):
+                    col = self.columns[col_idx]
+                    if col in position:
+                        src.append(j)
+                        dst.append(position[col])
+                n = block.shape[0]
+                if src:
+                    out[start:start + n][:, dst] = block[:, src]
+                start += n
+            return out
+
+    def rows_matrix(self, rows, columns=None):
+        """Returns the given rows as one float32 matrix over `columns`, gathered block by block."""
+        with self._lock:
+            columns = self.columns if columns is None else list(columns)
+            position = {c: j for j, c in enumerate(columns)}
+            out = np.full((len(rows), len(columns)), np.nan, dtype=np.float32)
+
+            by_block = {}
+            for i, row in enumerate(rows):
+                block, r = self._rows[row]
+                by_block.setdefault(block, ([], []))
+                by_block[block][0].append(i)
+                by_block[block][1].append(r)
+
+            for block, (out_idx, in_idx) in by_block.items():
+                src, dst = [], []
+                for j, col_idx in enumerate(self._block_cols[block]):
+                    col = self.columns[col_idx]
+                    if col in position:
+                        src.append(j)
+                        dst.append(position[col])
+                if src:
+                    out[np.ix_(out_idx, dst)] = self._blocks[block][np.ix_(in_idx, src)]
+            return out
+
+    def export_csv(self, path, chunk_rows=MIGRATION_CHUNK_ROWS):
+        """
+        Writes every row to `path` laid out like training_features.csv,
+        `chunk_rows` rows at a time so the whole store is never copied into
+        one frame. Returns the number of rows written.
+        """
+        with self._lock:
+            total, columns = len(self._rows), list(self.columns)
+            with atomic_open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                for start in range(0, total, chunk_rows):
+                    stop = min(start + chunk_rows, total)
+                    df = pd.DataFrame(self.rows_matrix(range(start, stop), columns), columns=columns)
+                    df['artist'] = self.artists[start:stop]
+                    df['track'] = self.tracks[start:stop]
+                    df['label'] = self.labels[start:stop]
+                    df['track_id'] = self.track_ids[start:stop]
+                    df.to_csv(f, index=False, header=start == 0)
+            return total
+
+    # --- Migration ---
+    def migration_state(self):
+        """Progress of the legacy CSV import: {'chunks': imported so far, 'done': bool}, or {} if never started."""
+        path = os.path.join(self.root, MIGRATION_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_migration_state(self, chunks, done):
+        write_json(os.path.join(self.root, MIGRATION_FILE), {'chunks': chunks, 'done': done})
+
+    def migrate_csv(self, csv_path=LEGACY_CSV_PATH):
+        """
+        Imports the legacy training_features.csv in chunks. Returns rows
+        imported. Progress is recorded after every chunk, so an interrupted
+        migration resumes at the next chunk instead of starting over. Chunk
+        segments have fixed names, and sequence keys that sort before every
+        later append.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        imported = 0
+        chunks_done = self.migration_state().get('chunks', 0)
+        chunk_no = 0
+        try:
+            for chunk_no, chunk in enumerate(pd.read_csv(csv_path, chunksize=MIGRATION_CHUNK_ROWS, encoding='utf-8-sig')):
+                if chunk_no < chunks_done:
+                    continue
+                name = f"{0:08d}-migration-{chunk_no:06d}"
+                # Written just before a crash that lost the progress update: already loaded
+                if not os.path.exists(os.path.join(self.root, f"seg-{name}.npz")):
+                    meta = {col: chunk.pop(col).fillna('').astype(str).tolist() if col in chunk else [''] * len(chunk)
+                            for col in META_COLUMNS}
+                    columns = list(chunk.columns)
+                    values = chunk.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+                    meta[SEQ_COLUMN] = _seq_keys(name, len(chunk))
+                    with self._lock:
+                        path = self._write_segment(columns, values, meta, name)
+                        block = self._add_block(columns, values, path)
+                        for i in range(len(chunk)):
+                            self._add_row(block, i, meta)
+                    imported += len(chunk)
+                self._save_migration_state(chunk_no + 1, False)
+        except pd.errors.EmptyDataError:
+            pass
+        self._save_migration_state(max(chunks_done, chunk_no + 1), True)
+        return imported
+
+
+def _seq_keys(name, count):
+    """Sequence keys for `count` rows written together as segment `name`."""
+    return [f"{name}:{i:08d}" for i in range(count)]
+
+
+class _DirectoryLock:
+    """
+    Cross-process lock on a store directory: an O_EXCL lock file. Merges
+    take it without blocking and simply skip if it is busy; loading waits
+    for it. A lock file older than LOCK_STALE_SECONDS is treated as left
+    behind by a crash and removed.
+    """
+
+    def __init__(self, root, blocking=True):
+        self.path = os.path.join(root, LOCK_FILE)
+        self.blocking = blocking
+        self.acquired = False
+
+    def __enter__(self):
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                os.close(fd)
+                self.acquired = True
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if not self.blocking:
+                    return self
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            self.acquired = False
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_feature_store():
+    """
+    Returns the shared FeatureStore. On first use the store is seeded from
+    the legacy training_features.csv so existing caches carry over; an
+    interrupted migration picks up where it stopped.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore()
+            if not _store.migration_state().get('done') and os.path.exists(LEGACY_CSV_PATH):
+                print(f"Migrating '{LEGACY_CSV_PATH}' into the feature store...")
+                count = _store.migrate_csv(LEGACY_CSV_PATH)
+                print(f"Migrated {count} rows.")
+        return _store
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Compact the feature store, optionally exporting it as a CSV.")
+    parser.add_argument('--export', metavar='PATH', default=None, help="Also write every row to this CSV")
+    args = parser.parse_args()
+
+    store = get_feature_store()
+    store.compact()
+    print(f"Feature store at '{store.root}' holds {len(store)} rows x {len(store.columns)} features.")
+    if args.export:
+        print(f"Exported {store.export_csv(args.export)} rows to '{args.export}'.")
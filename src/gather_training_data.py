@@ -1,18 +1,27 @@
-import os
-import pandas as pd
 import tqdm
 import random
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-import time
 
-from src.feature_extraction import process_and_extract_features
-from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI
+from src.feature_extraction import download_and_decode, extract_features_from_decoded, AST_BATCH_SIZE
+from src.feature_store import get_feature_store
+from src.pipeline import Stage, run_pipeline
+from src.rate_limit import TokenBucket
+from src.spotify_client import get_spotify, all_pages
 
-def gather_training_data():
+# --- PARALLELISM ---
+GATHER_WORKERS = 4           # Concurrent download + decode workers
+DOWNLOADS_PER_SECOND = 0.6   # Shared politeness limit (the old loop slept 1.2-2.3s per song)
+WRITE_BATCH_ROWS = 25        # Feature rows buffered before one store append
+
+def gather_training_data(workers=GATHER_WORKERS, write_batch=WRITE_BATCH_ROWS):
     """
     A resumable script to gather training data from Spotify playlists.
     It orchestrates the download, feature extraction, and data saving.
+
+    Songs are downloaded and decoded by `workers` threads, the AST runs in
+    batches, and a single writer (this thread) flushes rows to the feature
+    store every `write_batch` songs. Resume state is the store's set of
+    (artist, track, label) keys, and appends skip keys that already exist,
+    so a crashed run can simply be restarted.
     """
     # --- 1. SETUP ---
     TRAINING_PLAYLISTS = {
@@ -29,44 +38,28 @@ def gather_training_data():
         'edm-club': 'spotify:playlist:2Fl0AxmDN4BPYvgZrtQSZF'
     }
     MAX_SONGS_PER_PLAYLIST = 150
-    output_filename = 'training_features.csv'
-    processed_songs_memory = set()
 
-    # --- 2. LOAD MEMORY (From previously saved CSV) ---
-    print("Loading script memory from CSV...")
-    if os.path.exists(output_filename):
-        try:
-            df_existing = pd.read_csv(output_filename)
-            for index, row in df_existing.iterrows():
-                processed_songs_memory.add((row['artist'], row['track']))
-            print(f"Found {len(processed_songs_memory)} songs with features already saved.")
-        except pd.errors.EmptyDataError:
-            print("Found an empty existing CSV. Starting fresh.")
+    # --- 2. LOAD MEMORY (From the feature store) ---
+    print("Loading script memory from the feature store...")
+    store = get_feature_store()
+    processed_songs_memory = store.labeled_keys()
+    if processed_songs_memory:
+        print(f"Found {len(processed_songs_memory)} songs with features already saved.")
     else:
         print("No existing data found. Starting a new training set.")
 
     # --- 3. AUTHENTICATION ---
     print("Connecting to Spotify...")
-    sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope="playlist-read-private",
-        requests_timeout=30
-    ))
+    sp = get_spotify()
     print("Successfully connected to Spotify!")
+    limiter = TokenBucket(DOWNLOADS_PER_SECOND, capacity=workers)
 
     # --- 4. MAIN DATA GATHERING LOOP ---
     for label, playlist_id in TRAINING_PLAYLISTS.items():
         print(f"\n--- Starting Playlist: '{label}' ---")
         
         try:
-            results = sp.playlist_items(playlist_id)
-            items = results['items']
-            # Continue fetching all songs from the playlist
-            while results['next']:
-                results = sp.next(results)
-                items.extend(results['items'])
+            items = all_pages(sp, sp.playlist_items(playlist_id))
         except Exception as e:
             print(f"CRITICAL ERROR: Could not fetch playlist '{label}'. Skipping. Error: {e}")
             continue
@@ -77,49 +70,52 @@ def gather_training_data():
             random.seed(42) # Use a seed for reproducible "random" sampling
             items = random.sample(items, MAX_SONGS_PER_PLAYLIST)
 
-        # --- Loop through each song in the playlist ---
-        for item in tqdm.tqdm(items, desc=f"Processing '{label}'"):
-            try:
-                track = item.get('track')
-                if not (track and track.get('artists')):
-                    continue
-
-                artist = track['artists'][0]['name']
-                name = track['name']
-
-                # --- Check against CSV memory ---
-                if (artist, name) in processed_songs_memory:
-                    continue 
-
-                # --- DELEGATE ALL WORK TO THE WORKER FUNCTION ---
-                features = process_and_extract_features(
-                    artist=artist,
-                    title=name,
-                    playlist_label=label,
-                    keep_audio=False
-                )
-                
-                # --- INSTANT SAVE ---
-                if features:
-                    features.update({'artist': artist, 'track': name, 'label': label})
-                    new_row_df = pd.DataFrame([features])
-                    
-                    write_header = not os.path.exists(output_filename)
-                    new_row_df.to_csv(
-                        output_filename, 
-                        mode='a', 
-                        header=write_header, 
-                        index=False, 
-                        encoding='utf-8-sig'
-                    )
-                    
-                    processed_songs_memory.add((artist, name))
-                
-                time.sleep(random.uniform(1.2, 2.3))
-
-            except Exception as e:
-                print(f"\nSkipping a song due to an unexpected error in the main loop: {e}")
+        # --- Filter out songs we already have features for ---
+        pending = []
+        for item in items:
+            track = item.get('track')
+            if not (track and track.get('artists')):
                 continue
+            if (track['artists'][0]['name'], track['name'], label) in processed_songs_memory:
+                continue
+            pending.append(track)
+
+        # --- Download/decode in parallel, AST in batches, one writer ---
+        progress = tqdm.tqdm(total=len(pending), desc=f"Processing '{label}'")
+        buffer = []
+
+        def flush():
+            store.append(buffer, skip_existing=True)
+            buffer.clear()
+
+        def fetch(track):
+            limiter.acquire()
+            return download_and_decode(track['artists'][0]['name'], track['name'], track.get('id'))
+
+        def on_result(track, features):
+            artist, name = track['artists'][0]['name'], track['name']
+            features.update({'artist': artist, 'track': name, 'label': label, 'track_id': track.get('id')})
+            buffer.append(features)
+            processed_songs_memory.add((artist, name, label))
+            progress.update(1)
+            if len(buffer) >= write_batch:
+                flush()
+
+        try:
+            run_pipeline(
+                pending,
+                [
+                    Stage('download', fetch, workers=workers),
+                    Stage('features', extract_features_from_decoded, batch_size=AST_BATCH_SIZE),
+                ],
+                ordered=False,
+                on_result=on_result
+            )
+        except Exception as e:
+            print(f"\nPlaylist '{label}' stopped due to an unexpected error: {e}")
+        finally:
+            flush()
+            progress.close()
 
         print(f"Finished processing playlist '{label}'.")
 
@@ -0,0 +1,180 @@
+import time
+import uuid
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+JOB_WORKERS = 1          # Jobs run at once; they share the models, YouTube and the Spotify rate limit
+MAX_QUEUED_JOBS = 8      # Further submissions are refused until the queue drains
+EMIT_INTERVAL = 0.25     # Seconds between coalesced progress emits per job
+KEEP_FINISHED = 50       # Finished jobs kept around for status lookups
+
+ACTIVE = ('queued', 'running')
+
+
+class Job:
+    """One classification request: its identity, status and buffered progress."""
+
+    def __init__(self, playlist_id, add_repeats=False, full=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.playlist_id = playlist_id
+        self.add_repeats = add_repeats
+        self.full = full
+        self.status = 'queued'
+        self.error = None
+        self.processed = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def progress(self, artist, name, track_id, label, conf, timings=None):
+        """classify_and_create callback: buffers the result for the next coalesced emit."""
+        item = {
+            'song': f"{artist} - {name}",
+            'track_id': track_id,
+            'label': label,
+            'confidence': f"{conf*100:.1f}%"
+        }
+        if timings:
+            item['timings_ms'] = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+        with self._lock:
+            self.processed += 1
+            self._pending.append(item)
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'playlist_id': self.playlist_id,
+            'add_repeats': self.add_repeats,
+            'full': self.full,
+            'status': self.status,
+            'error': self.error,
+            'processed': self.processed,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobManager:
+    """
+    Runs classification jobs on a fixed pool of worker threads fed by a
+    bounded queue.
+
+    `run(job)` does the actual work and should poll `job.cancelled()`.
+    `emit(event, payload, job_id)` delivers events to whoever follows a job
+    (the app maps it onto a Socket.IO room). Per-track results are not sent
+    one by one: they are buffered on the job and flushed as a single
+    'updates' event at most every `emit_interval` seconds, plus a final
+    flush when the job ends. Submitting a playlist that already has a
+    queued or running job returns that job instead of starting another.
+    """
+
+    def __init__(self, run, emit, workers=JOB_WORKERS, max_queued=MAX_QUEUED_JOBS, emit_interval=EMIT_INTERVAL):
+        self.run = run
+        self.emit = emit
+        self.emit_interval = emit_interval
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._flush_periodically, name="job-emitter", daemon=True).start()
+
+    # --- Public API ---
+    def submit(self, playlist_id, add_repeats=False, full=False):
+        """
+        Queues a job and returns (job, created). Raises queue.Full when too
+        many jobs are already waiting.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.playlist_id == playlist_id and job.status in ACTIVE and not job.cancelled():
+                    return job, False
+
+            job = Job(playlist_id, add_repeats, full)
+            self._queue.put_nowait(job)
+            self._jobs[job.id] = job
+            self._prune()
+        self._emit_status(job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """Flags a job to stop. A queued job never starts; a running one stops at its next check."""
+        job = self.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return False
+        job.cancel()
+        if job.status == 'queued':
+            self._finish(job, 'cancelled')
+        return True
+
+    # --- Internals ---
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job.cancelled():
+                continue
+            job.status = 'running'
+            job.started = time.time()
+            self._emit_status(job)
+            try:
+                self.run(job)
+                self._finish(job, 'cancelled' if job.cancelled() else 'done')
+            except Exception as e:
+                print(f"\n❌ [JOB {job.id} FAILED]: {e}")
+                traceback.print_exc()
+                job.error = str(e)
+                self._finish(job, 'failed')
+
+    def _finish(self, job, status):
+        self._flush(job)
+        job.status = status
+        job.finished = time.time()
+        self._emit_status(job)
+
+    def _flush(self, job):
+        items = job.drain()
+        if items:
+            self.emit('updates', {'job_id': job.id, 'processed': job.processed, 'items': items}, job.id)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.emit_interval)
+            with self._lock:
+                running = [job for job in self._jobs.values() if job.status == 'running']
+            for job in running:
+                self._flush(job)
+
+    def _emit_status(self, job):
+        self.emit('job_status', job.to_dict(), job.id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE]
+        for job_id in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job_id]
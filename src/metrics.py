@@ -0,0 +1,173 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# Histogram buckets in seconds, from a cached predict to a slow download
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# name -> (type, help) for every metric the app records
+METRICS = {
+    'stage_seconds': ('histogram', "Latency of one pass through a processing stage."),
+    'stage_in_flight': ('gauge', "Calls currently running inside a processing stage."),
+    'audio_cache_total': ('counter', "Audio cache lookups by result (hit/miss)."),
+    'feature_cache_total': ('counter', "Feature store lookups by result (match method or miss)."),
+    'download_failures_total': ('counter', "Songs whose audio could not be acquired, by reason."),
+    'extraction_failures_total': ('counter', "Songs that failed decoding or feature extraction, by step."),
+    'spotify_calls_total': ('counter', "Spotify Web API requests by HTTP method."),
+    'spotify_rate_limited_total': ('counter', "Spotify responses that were 429 Too Many Requests."),
+    'tracks_classified_total': ('counter', "Tracks classified, by where their features came from."),
+    'sort_runs_total': ('counter', "Sort runs by kind (unchanged playlist, delta or full)."),
+}
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Minimal in-process metrics store: counters, gauges and fixed-bucket
+    histograms, each keyed by metric name plus a sorted tuple of labels.
+    Everything lives in memory and is rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}       # (name, labels) -> float, for counters and gauges
+        self._histograms = {}   # (name, labels) -> _Histogram
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def reset(self):
+        """Forgets every recorded value (benchmarks use it between phases)."""
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Returns {name: {labels: value}}; histograms report (count, sum)."""
+        with self._lock:
+            out = {}
+            for (name, labels), value in self._values.items():
+                out.setdefault(name, {})[labels] = value
+            for (name, labels), h in self._histograms.items():
+                out.setdefault(name, {})[labels] = (h.count, h.sum)
+            return out
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            )
+
+        lines = []
+        described = set()
+
+        def describe(name, default_type):
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text = METRICS.get(name, (default_type, ''))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in values:
+            describe(name, 'untyped')
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), counts, total, count in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(list(LATENCY_BUCKETS) + ['+Inf'], counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+def render():
+    return REGISTRY.render()
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def _track_in_flight(stage, delta):
+    with _in_flight_lock:
+        _in_flight[stage] = _in_flight.get(stage, 0) + delta
+        REGISTRY.set('stage_in_flight', _in_flight[stage], stage=stage)
+
+
+@contextmanager
+def timed(stage, into=None):
+    """
+    Times the enclosed block as one pass through `stage`: records it in the
+    stage_seconds histogram and counts it in stage_in_flight while it runs.
+    If `into` is a dict, the elapsed seconds are also added to into[stage],
+    which is how per-track breakdowns are collected. Yields a dict whose
+    'seconds' key is filled in when the block exits.
+    """
+    span = {'seconds': None}
+    _track_in_flight(stage, 1)
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span['seconds'] = elapsed = time.perf_counter() - start
+        _track_in_flight(stage, -1)
+        REGISTRY.observe('stage_seconds', elapsed, stage=stage)
+        if into is not None:
+            into[stage] = into.get(stage, 0.0) + elapsed
@@ -0,0 +1,190 @@
+import os
+import json
+import threading
+import traceback
+
+# --- CONFIGURATION ---
+AST_MODEL_NAME = "MIT/ast-finetuned-audioset-10-10-0.4593"
+CLASSIFIER_PATH = os.path.join('models', 'song_classifier.joblib')
+COMPACT_CLASSIFIER_PATH = os.path.join('models', 'song_classifier_compact.joblib')
+COMPACT_INFO_PATH = os.path.join('models', 'song_classifier_compact.json')
+MODEL_MANIFEST_PATH = os.path.join('models', 'model_manifest.json')
+# Set USE_COMPACT_CLASSIFIER=1 to serve the model built by `run_training --export-compact`
+USE_COMPACT_CLASSIFIER = os.environ.get('USE_COMPACT_CLASSIFIER') == '1'
+
+# AST inference mode: 'fp32' (eager, full precision) or 'int8' (dynamic
+# quantization of the Linear layers). AST_COMPILE can add 'compile'
+# (torch.compile) or 'trace' (TorchScript) on top. AST_THREADS pins torch's
+# intra-op thread count; 0 keeps torch's default.
+AST_INFERENCE_MODE = os.environ.get('AST_INFERENCE_MODE', 'fp32')
+AST_COMPILE = os.environ.get('AST_COMPILE', 'none')
+AST_THREADS = int(os.environ.get('AST_THREADS', '0'))
+AST_TRACE_FRAMES = 1024   # Spectrogram frames the AST processor pads every clip to
+AST_TRACE_MEL_BINS = 128
+
+# Everything heavy (torch, transformers, the AST weights, the RandomForest)
+# is loaded here on first use instead of at import time, so importing the app
+# stays fast. warm_up() loads it all on a background thread at server start.
+_ast_lock = threading.Lock()
+_classifier_lock = threading.Lock()
+_ast = {}          # (mode, compile) -> (processor, model)
+_classifier = None
+_classifier_mtime = None
+_status = {'ast': 'not loaded', 'classifier': 'not loaded'}
+_listeners = []
+
+
+def _set_status(name, state):
+    _status[name] = state
+    snapshot = status()
+    for listener in list(_listeners):
+        try:
+            listener(snapshot)
+        except Exception as e:
+            print(f"[MODELS] Status listener failed: {e}")
+
+
+def status():
+    """Returns the load state of every model plus an overall 'ready' flag."""
+    snapshot = dict(_status)
+    snapshot['ready'] = all(v == 'ready' for v in _status.values())
+    return snapshot
+
+
+def add_status_listener(listener):
+    """Registers `listener(status_dict)` to be called whenever a model changes state."""
+    _listeners.append(listener)
+
+
+class _TracedAST:
+    """Makes a TorchScript-traced AST look like the HF model (`.config`, `.logits`)."""
+
+    class _Output:
+        def __init__(self, logits):
+            self.logits = logits
+
+    def __init__(self, traced, config):
+        self.traced = traced
+        self.config = config
+
+    def __call__(self, input_values, **_):
+        return self._Output(self.traced(input_values)[0])
+
+
+def _optimize_ast(model, mode, compile_mode):
+    import torch
+    if AST_THREADS:
+        torch.set_num_threads(AST_THREADS)
+
+    if mode == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif mode != 'fp32':
+        raise ValueError(f"Unknown AST inference mode '{mode}'")
+
+    if compile_mode == 'compile':
+        model = torch.compile(model)
+    elif compile_mode == 'trace':
+        example = torch.zeros(1, AST_TRACE_FRAMES, AST_TRACE_MEL_BINS)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example, strict=False)
+        model = _TracedAST(torch.jit.freeze(traced.eval()), model.config)
+    elif compile_mode != 'none':
+        raise ValueError(f"Unknown AST compile mode '{compile_mode}'")
+    return model
+
+
+def get_ast_model(mode=None, compile_mode=None):
+    """
+    Returns the (processor, model) pair for the AST, loading it on first use.
+    `mode` and `compile_mode` default to AST_INFERENCE_MODE and AST_COMPILE;
+    each combination is built once and cached.
+    """
+    key = (mode or AST_INFERENCE_MODE, compile_mode or AST_COMPILE)
+    with _ast_lock:
+        if key not in _ast:
+            _set_status('ast', 'loading')
+            print(f"Loading Audio Classification Model ({key[0]}, compile={key[1]})...")
+            try:
+                from transformers import AutoProcessor, AutoModelForAudioClassification
+                processor = AutoProcessor.from_pretrained(AST_MODEL_NAME, use_fast=True)
+                model = AutoModelForAudioClassification.from_pretrained(
+                    AST_MODEL_NAME, torchscript=(key[1] == 'trace')
+                )
+                model.eval()
+                model = _optimize_ast(model, *key)
+            except Exception:
+                _set_status('ast', 'failed')
+                raise
+            _ast[key] = (processor, model)
+            _set_status('ast', 'ready')
+            print("Model loaded.")
+        return _ast[key]
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_stale_compact = None
+
+def classifier_path():
+    """
+    The compact model when it's enabled, exists and was built from the
+    current model version; the full one otherwise. A compact model left
+    behind by an update or retraining is refused, with a message.
+    """
+    global _stale_compact
+    if USE_COMPACT_CLASSIFIER and os.path.exists(COMPACT_CLASSIFIER_PATH):
+        built_from = _read_json(COMPACT_INFO_PATH).get('source_version')
+        current = _read_json(MODEL_MANIFEST_PATH).get('version')
+        if built_from is not None and built_from == current:
+            return COMPACT_CLASSIFIER_PATH
+        if _stale_compact != (built_from, current):
+            _stale_compact = (built_from, current)
+            print(f"[MODELS] The compact model was built from version {built_from}, the current model is "
+                  f"version {current}. Serving the full model; re-run `run_training --export-compact`.")
+    return CLASSIFIER_PATH
+
+
+def get_classifier(path=None):
+    """
+    Returns the trained sklearn pipeline. It stays cached across jobs and is
+    only reloaded when the file on disk has a newer mtime (e.g. after retraining).
+    """
+    global _classifier, _classifier_mtime
+    path = path or classifier_path()
+    with _classifier_lock:
+        mtime = (path, os.path.getmtime(path))
+        if _classifier is None or mtime != _classifier_mtime:
+            _set_status('classifier', 'loading')
+            try:
+                import joblib
+                _classifier = joblib.load(path)
+            except Exception:
+                _set_status('classifier', 'failed')
+                raise
+            _classifier_mtime = mtime
+            _set_status('classifier', 'ready')
+        return _classifier
+
+
+def warm_up(on_status=None):
+    """Loads every model on a daemon thread. Returns the thread."""
+    if on_status:
+        add_status_listener(on_status)
+
+    def run():
+        for loader in (get_classifier, get_ast_model):
+            try:
+                loader()
+            except Exception as e:
+                print(f"[MODELS] Warm-up failed: {e}")
+                traceback.print_exc()
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
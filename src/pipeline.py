@@ -0,0 +1,184 @@
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+_DONE = object()      # Marks the end of the input stream
+_DROPPED = object()   # Marks an item a stage filtered out or failed on
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    `fn` is called with a single item, or with a list of up to `batch_size`
+    items when batching is enabled (it must then return a list of the same
+    length). Returning None drops the item from later stages.
+    `workers` sets the degree of parallelism; `use_processes` runs `fn` in a
+    process pool instead of on the stage's threads (fn must be picklable).
+    """
+
+    def __init__(self, name, fn, workers=1, batch_size=1, use_processes=False, batch_wait=0.5):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.use_processes = use_processes
+        self.batch_wait = batch_wait
+
+
+def run_pipeline(items, stages, queue_size=16, ordered=True, on_result=None, should_stop=None):
+    """
+    Pushes `items` through `stages`, each stage running on its own pool of
+    workers with a bounded queue in front of it so a fast stage can never run
+    far ahead of a slow one.
+
+    Results are handed to `on_result(item, result)` on the calling thread,
+    either in input order (`ordered=True`) or as soon as they finish.
+    Returns the list of (item, result) pairs that made it through.
+
+    Once `should_stop()` returns True no further items are fed in and items
+    already queued are dropped without being processed. The same happens if
+    `on_result` raises: the exception propagates, and the feeder and stage
+    workers wind down in the background instead of blocking on full queues.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    pools = [ProcessPoolExecutor(max_workers=s.workers) if s.use_processes else None for s in stages]
+    aborted = threading.Event()
+
+    def stopped():
+        return aborted.is_set() or (should_stop is not None and should_stop())
+
+    def call(stage, pool, arg):
+        if pool is not None:
+            return pool.submit(stage.fn, arg).result()
+        return stage.fn(arg)
+
+    def take_batch(stage, in_q):
+        """Blocks for one item, then gathers more for up to `batch_wait` seconds."""
+        first = in_q.get()
+        if first is _DONE or stage.batch_size == 1:
+            return first, []
+        batch = [first]
+        while len(batch) < stage.batch_size:
+            try:
+                nxt = in_q.get(timeout=stage.batch_wait)
+            except queue.Empty:
+                break
+            if nxt is _DONE:
+                in_q.put(_DONE)   # Leave the marker for this stage's other workers
+                break
+            batch.append(nxt)
+        return None, batch
+
+    def worker(stage, pool, in_q, out_q, finished):
+        while True:
+            single, batch = take_batch(stage, in_q)
+            if single is _DONE:
+                in_q.put(_DONE)
+                break
+            packets = batch or [single]
+
+            # Items that were dropped upstream pass straight through so ordering still works;
+            # once the run is stopped every queued item is dropped instead of processed
+            live = [] if stopped() else [p for p in packets if p[2] is not _DROPPED]
+            outputs = []
+            if live:
+                try:
+                    if stage.batch_size > 1:
+                        outputs = call(stage, pool, [p[2] for p in live])
+                    else:
+                        outputs = [call(stage, pool, live[0][2])]
+                except Exception as e:
+                    print(f"\n[PIPELINE] Stage '{stage.name}' failed: {e}")
+                    traceback.print_exc()
+                    outputs = [None] * len(live)
+
+            results = iter(outputs)
+            for seq, item, value in packets:
+                if value is not _DROPPED:
+                    value = next(results, None)
+                    if value is None:
+                        value = _DROPPED
+                out_q.put((seq, item, value))
+
+        with finished:
+            finished.count -= 1
+            if finished.count == 0:
+                out_q.put(_DONE)
+
+    for stage, pool, in_q, out_q in zip(stages, pools, queues, queues[1:]):
+        counter = _Counter(stage.workers)
+        for _ in range(stage.workers):
+            threading.Thread(target=worker, args=(stage, pool, in_q, out_q, counter), daemon=True).start()
+
+    def feed():
+        for seq, item in enumerate(items):
+            if stopped():
+                break
+            queues[0].put((seq, item, item))
+        queues[0].put(_DONE)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    collected = []
+    pending = {}
+    next_seq = 0
+
+    def deliver(item, value):
+        if value is _DROPPED:
+            return
+        collected.append((item, value))
+        if on_result:
+            on_result(item, value)
+
+    finished = False
+    try:
+        while True:
+            packet = queues[-1].get()
+            if packet is _DONE:
+                finished = True
+                break
+            seq, item, value = packet
+            if not ordered:
+                deliver(item, value)
+                continue
+            pending[seq] = (item, value)
+            while next_seq in pending:
+                deliver(*pending.pop(next_seq))
+                next_seq += 1
+    finally:
+        if not finished:
+            # Nobody reads the last queue any more: stop feeding, let the workers
+            # drop what's queued, and empty the last queue until the end marker
+            # arrives so no thread stays blocked on a full queue
+            aborted.set()
+            threading.Thread(target=_drain, args=(queues[-1],), daemon=True).start()
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    for seq in sorted(pending):
+        deliver(*pending[seq])
+    return collected
+
+
+def _drain(q):
+    while q.get() is not _DONE:
+        pass
+
+
+class _Counter:
+    """Counts down the live workers of a stage; the last one out closes the stage."""
+
+    def __init__(self, count):
+        self.count = count
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
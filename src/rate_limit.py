@@ -0,0 +1,60 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by a pool of workers.
+
+    `rate` tokens are added per second up to `capacity`; acquire() blocks
+    until one is available. When a remote service starts refusing us
+    (403/429), call penalize(): the rate is cut and every worker is paused
+    for an exponentially growing cooldown. Each success after that lets the
+    rate creep back up towards the configured maximum.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None, max_backoff=300.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.capacity = capacity or max(1.0, rate)
+        self.max_backoff = max_backoff
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """Backs off after a rate-limit response. Honors `retry_after` seconds if given."""
+        with self._lock:
+            self._backoff = min(self.max_backoff, max(1.0, self._backoff * 2))
+            pause = max(self._backoff, retry_after or 0)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0
+            return pause
+
+    def reward(self):
+        """Records a success: shrinks the backoff and recovers the rate."""
+        with self._lock:
+            self._backoff = self._backoff / 2 if self._backoff > 1 else 0.0
+            self.rate = min(self.max_rate, self.rate * 1.1)
@@ -1,44 +1,135 @@
 # In src/run_training.py
 
-import pandas as pd
+import os
+import json
+import time
+import threading
 import joblib
+import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
 from sklearn.metrics import accuracy_score, classification_report
 
-import seaborn as sns
-import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix
 
-def train_model():
+from src.feature_store import FeatureStore, get_feature_store
+from src.atomic_io import atomic_open, write_json, copy_file
+
+# --- CONFIGURATION ---
+DESIGN_DIR = os.path.join('data', 'design_matrix')
+MODEL_PATH = os.path.join('models', 'song_classifier.joblib')
+CONFUSION_MATRIX_PATH = os.path.join('models', 'confusion_matrix.png')
+COMPACT_MODEL_PATH = os.path.join('models', 'song_classifier_compact.joblib')
+COMPACT_INFO_PATH = os.path.join('models', 'song_classifier_compact.json')   # Model version it was built from
+BENCHMARK_REPORT_PATH = os.path.join('models', 'benchmark_report.json')
+VERSIONS_DIR = os.path.join('models', 'versions')
+MODEL_MANIFEST_PATH = os.path.join('models', 'model_manifest.json')
+KEEP_VERSIONS = 10             # Older versioned model files are deleted
+
+# --- INCREMENTAL UPDATES ---
+UPDATE_MIN_ROWS = 25           # New store rows needed before an update is worth it
+TREES_PER_UPDATE = 20          # Trees grown per update (warm start)
+MAX_TREES = 300                # Past this, ask for a full retrain instead
+REPLAY_ROWS_PER_CLASS = 200    # Older rows mixed into each update so every class is present
+
+# (n_estimators, max_depth) tried smallest-first when exporting the compact model
+COMPACT_CANDIDATES = [(25, 10), (40, 14), (60, 18), (100, 24)]
+
+def load_design_matrix(rebuild=False):
+    """
+    Returns (X, y, columns, seqs) for training. X is a float32 matrix
+    memory-mapped from data/design_matrix/X.npy, y the label vector, columns
+    the feature names and seqs the store's sequence key of every row. The
+    cache is rebuilt from the feature store only when the store's
+    fingerprint no longer matches the one saved in manifest.json.
+    """
+    store = get_feature_store()
+    fingerprint = store.fingerprint()
+    manifest_path = os.path.join(DESIGN_DIR, 'manifest.json')
+    x_path, y_path = os.path.join(DESIGN_DIR, 'X.npy'), os.path.join(DESIGN_DIR, 'y.npy')
+    seq_path = os.path.join(DESIGN_DIR, 'seqs.npy')
+
+    if not rebuild and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('fingerprint') == fingerprint and os.path.exists(seq_path):
+            X = np.load(x_path, mmap_mode='r')
+            return X, np.load(y_path), manifest['columns'], np.load(seq_path)
+
+    print("Feature store changed since the last run, rebuilding the design matrix...")
+    os.makedirs(DESIGN_DIR, exist_ok=True)
+    X = store.matrix()
+    y = np.array(store.labels, dtype=str)
+    seqs = np.array(store.seqs, dtype=str)
+    columns = list(store.columns)
+
+    # Write everything to temp names first so an interrupted rebuild is never trusted
+    for path, array in ((x_path, X), (y_path, y), (seq_path, seqs)):
+        with atomic_open(path, 'wb') as f:
+            np.save(f, array)
+    write_json(manifest_path, {'fingerprint': fingerprint, 'columns': columns, 'rows': len(y)})
+
+    return np.load(x_path, mmap_mode='r'), y, columns, seqs
+
+def load_training_frame(rebuild=False):
+    """Returns (X, y, seqs) with X as a DataFrame over the cached float32 design matrix."""
+    X_all, y, columns, seqs = load_design_matrix(rebuild=rebuild)
+    # A DataFrame over the float32 matrix keeps the feature names in the saved pipeline
+    return pd.DataFrame(X_all, columns=columns, copy=False), y, seqs
+
+def split_dataset(X, y, seqs):
+    # `stratify=y` is important for imbalanced datasets. It ensures the test set
+    # has the same proportion of songs from each playlist as the training set.
+    # The rows' sequence keys are split alongside, so the held-out rows can be
+    # told apart later.
+    return train_test_split(X, y, seqs, test_size=0.2, random_state=42, stratify=y)
+
+def plot_confusion_matrix(cm, classes, show_plot=False, path=CONFUSION_MATRIX_PATH):
+    """Draws the confusion matrix. Headless runs save it to `path` instead of opening a window."""
+    import matplotlib
+    if not show_plot:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 10))
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
+                xticklabels=classes, yticklabels=classes)
+    plt.ylabel('Actual Playlist')
+    plt.xlabel('Predicted Playlist')
+    plt.title('Confusion Matrix')
+    if show_plot:
+        plt.show()
+    else:
+        plt.savefig(path, bbox_inches='tight')
+        plt.close()
+        print(f"Confusion matrix saved to '{path}'")
+
+def train_model(show_plot=True, rebuild_cache=False, n_jobs=-1):
     """
     Loads the feature data, trains a classifier, evaluates it,
     and saves the final model.
+
+    `show_plot=False` runs headless (the confusion matrix is saved instead
+    of shown), `n_jobs` is the number of cores the forest uses (-1 = all).
     """
     # --- 1. Load and Prepare Data ---
     print("Loading feature dataset...")
-    try:
-        df = pd.read_csv('training_features.csv')
-    except FileNotFoundError:
-        print("Error: 'training_features.csv' not found. Please run the data gathering script first.")
+    start = time.perf_counter()
+    X, y, seqs = load_training_frame(rebuild=rebuild_cache)
+    if len(y) == 0:
+        print("Error: the feature store is empty. Please run the data gathering script first.")
         return
 
-    print(f"Loaded {len(df)} songs across {len(df['label'].unique())} playlists.")
-
-    # Drop non-feature columns. We keep 'artist' and 'track' for now if they exist,
-    # but will drop them before training.
-    X = df.drop(['label', 'artist', 'track'], axis=1, errors='ignore')
-    y = df['label']
+    print(f"Loaded {len(y)} songs across {len(np.unique(y))} playlists in {time.perf_counter() - start:.2f}s.")
 
     # --- 2. Split Data into Training and Testing Sets ---
-    # `stratify=y` is important for imbalanced datasets. It ensures the test set
-    # has the same proportion of songs from each playlist as the training set.
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+    X_train, X_test, y_train, y_test, seq_train, seq_test = split_dataset(X, y, seqs)
     print(f"Training with {len(X_train)} songs, testing with {len(X_test)} songs.")
 
     # --- 3. Build the Model Pipeline ---
@@ -48,13 +139,14 @@ def train_model():
     model_pipeline = Pipeline([
         ('imputer', SimpleImputer(strategy='mean')),
         ('scaler', StandardScaler()),
-        ('classifier', RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced'))
+        ('classifier', RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced', n_jobs=n_jobs))
     ])
 
     # --- 4. Train and Evaluate the Model ---
     print("\nTraining the Random Forest model...")
+    start = time.perf_counter()
     model_pipeline.fit(X_train, y_train)
-    print("Training complete!")
+    print(f"Training complete in {time.perf_counter() - start:.1f}s!")
 
     print("\nEvaluating model on the unseen test set...")
     y_pred = model_pipeline.predict(X_test)
@@ -68,22 +160,332 @@ def train_model():
 
     # --- 5. Save the Final Model ---
     print("\nSaving the final trained model...")
-    joblib.dump(model_pipeline, 'models/song_classifier.joblib')
-    print("Final model pipeline saved to 'models/song_classifier.joblib'")
+    # Parallel predict only pays off on big batches; per-song inference is faster single-threaded
+    model_pipeline.named_steps['classifier'].n_jobs = None
+    version = publish_model(
+        model_pipeline, kind='full', trained=seq_train, held_out=seq_test,
+        imputer_counts=X_train.notna().sum().to_numpy().tolist()
+    )
+    print(f"Final model pipeline saved to '{MODEL_PATH}' (version {version})")
     print("You are now ready to use 'classify_playlist.py'!")
 
     # Generate the confusion matrix
     cm = confusion_matrix(y_test, y_pred, labels=model_pipeline.classes_)
 
-    # Plot the confusion matrix
-    plt.figure(figsize=(12, 10))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
-                xticklabels=model_pipeline.classes_, yticklabels=model_pipeline.classes_)
-    plt.ylabel('Actual Playlist')
-    plt.xlabel('Predicted Playlist')
-    plt.title('Confusion Matrix')
-    plt.show()
+    # Plot the confusion matrix (outside the timed path above)
+    plot_confusion_matrix(cm, model_pipeline.classes_, show_plot=show_plot)
+
+
+def load_model_manifest():
+    """Returns the manifest of the current model version, or {} before the first versioned training."""
+    if not os.path.exists(MODEL_MANIFEST_PATH):
+        return {}
+    with open(MODEL_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_row_sets(manifest):
+    """
+    Returns (trained, held_out): the sequence keys of the store rows the
+    manifest's model version was fitted on, and of the rows held out to
+    test it. Keys, unlike row numbers, survive reloads and merges.
+    """
+    with np.load(manifest['rows_path']) as data:
+        return data['trained'], data['held_out']
+
+def publish_model(pipeline, kind, trained, held_out, imputer_counts):
+    """
+    Saves `pipeline` as the next model version and swaps it in atomically.
+    The version is written to models/versions/ first, then copied over
+    MODEL_PATH with a rename, so the app (which reloads the classifier when
+    the file's mtime changes) never sees a half-written file. The sequence
+    keys of the `trained` and `held_out` store rows are saved next to it, so
+    the next update knows which rows are new. Returns the new version number.
+    """
+    manifest = load_model_manifest()
+    version = manifest.get('version', 0) + 1
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version_path = os.path.join(VERSIONS_DIR, f"song_classifier-v{version:04d}.joblib")
+    rows_path = os.path.join(VERSIONS_DIR, f"song_classifier-v{version:04d}.rows.npz")
+
+    with atomic_open(rows_path, 'wb') as f:
+        np.savez_compressed(f, trained=np.asarray(trained, dtype=str), held_out=np.asarray(held_out, dtype=str))
+    with atomic_open(version_path, 'wb') as f:
+        joblib.dump(pipeline, f)
+    copy_file(version_path, MODEL_PATH)
+
+    history = manifest.get('history', []) + [{
+        'version': version,
+        'kind': kind,
+        'trained_rows': len(trained),
+        'trees': pipeline.named_steps['classifier'].n_estimators,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }]
+    manifest = {
+        'version': version,
+        'path': version_path,
+        'rows_path': rows_path,
+        'trained_rows': len(trained),
+        'held_out_rows': len(held_out),
+        'imputer_counts': [int(c) for c in imputer_counts],
+        'history': history,
+    }
+    write_json(MODEL_MANIFEST_PATH, manifest, indent=2)
+
+    for old in history[:-KEEP_VERSIONS]:
+        for suffix in ('.joblib', '.rows.npz'):
+            old_path = os.path.join(VERSIONS_DIR, f"song_classifier-v{old['version']:04d}{suffix}")
+            if os.path.exists(old_path):
+                os.remove(old_path)
+    return version
+
+def _rescale_thresholds(tree, old_mean, old_scale, new_mean, new_scale):
+    """
+    Re-expresses a fitted tree's split thresholds in a new StandardScaler
+    scale. A split "scaled x <= t" is "raw x <= t * old_scale + old_mean",
+    so the old trees make exactly the same decisions after the scaler moves.
+    """
+    nodes = tree.tree_
+    split = nodes.children_left != -1    # Leaves have no threshold
+    features = nodes.feature[split]
+    thresholds = nodes.threshold         # A view onto the tree's node array
+    raw = thresholds[split] * old_scale[features] + old_mean[features]
+    thresholds[split] = (raw - new_mean[features]) / new_scale[features]
+
+_update_lock = threading.Lock()
+
+def update_model(min_rows=UPDATE_MIN_ROWS, trees=TREES_PER_UPDATE, replay_per_class=REPLAY_ROWS_PER_CLASS, n_jobs=-1):
+    """
+    Folds the feature store rows added since the current model version into
+    it without a full retrain:
+
+      1. the imputer's column means become running means over every row seen,
+      2. the scaler is partial_fit on the new rows, and every existing tree's
+         thresholds are rewritten for the new scale so its decisions hold,
+      3. `trees` more trees are grown with warm start, on the new rows plus
+         up to `replay_per_class` older training rows of each label.
+
+    New rows are the ones whose sequence key the model has neither trained
+    on nor held out for testing; held-out rows are never replayed. The store
+    is read afresh from disk, so rows other processes appended count too.
+    The result is published as a new version. Returns the version number,
+    or None when there was nothing (or not enough) to do.
+    """
+    with _update_lock:
+        manifest = load_model_manifest()
+        if not manifest or not os.path.exists(MODEL_PATH):
+            print("No versioned model yet. Run a full training first.")
+            return None
+
+        store = FeatureStore(get_feature_store().root)
+        seqs = np.array(store.seqs, dtype=str)
+        trained, held_out = load_row_sets(manifest)
+        new_rows = np.flatnonzero(~np.isin(seqs, np.concatenate([trained, held_out])))
+        if len(new_rows) < min_rows:
+            print(f"Only {len(new_rows)} new rows since version {manifest['version']}, not updating yet.")
+            return None
+
+        model = joblib.load(MODEL_PATH)
+        imputer, scaler, forest = (model.named_steps[name] for name in ('imputer', 'scaler', 'classifier'))
+        columns = list(model.feature_names_in_)
+        labels = np.array(store.labels, dtype=str)
+
+        unknown = set(labels[new_rows]) - set(forest.classes_)
+        if unknown:
+            print(f"New playlists {sorted(unknown)} aren't known to the model. Run a full training.")
+            return None
+        if forest.n_estimators + trees > MAX_TREES:
+            print(f"The forest would pass {MAX_TREES} trees. Run a full training to start a fresh base model.")
+            return None
+
+        print(f"Updating model version {manifest['version']} with {len(new_rows)} new rows...")
+        start = time.perf_counter()
+        X_new = store.rows_matrix(new_rows, columns).astype(np.float64)
+
+        # --- 1. Imputer: running column means ---
+        old_counts = np.array(manifest['imputer_counts'], dtype=np.float64)
+        observed = ~np.isnan(X_new)
+        counts = old_counts + observed.sum(axis=0)
+        sums = imputer.statistics_ * old_counts + np.where(observed, X_new, 0.0).sum(axis=0)
+        # Columns that were empty at training time were dropped by the imputer and stay dropped
+        imputer.statistics_ = np.where(old_counts > 0, sums / np.maximum(counts, 1), imputer.statistics_)
+
+        # --- 2. Scaler: partial_fit, then carry the old trees over to the new scale ---
+        old_mean, old_scale = scaler.mean_.copy(), scaler.scale_.copy()
+        scaler.partial_fit(imputer.transform(pd.DataFrame(X_new, columns=columns)))
+        for tree in forest.estimators_:
+            _rescale_thresholds(tree, old_mean, old_scale, scaler.mean_, scaler.scale_)
+
+        # --- 3. Warm-start more trees on new rows plus a replay of older ones ---
+        rng = np.random.default_rng(manifest['version'])
+        trained_rows = np.flatnonzero(np.isin(seqs, trained))
+        replay = []
+        for label in forest.classes_:
+            older = trained_rows[labels[trained_rows] == label]
+            replay.extend(rng.choice(older, size=min(replay_per_class, len(older)), replace=False))
+        rows = np.concatenate([np.array(replay, dtype=np.int64), new_rows])
+        if set(labels[rows]) != set(forest.classes_):
+            print("Some playlists have no stored rows left to replay. Run a full training.")
+            return None
+
+        # 'balanced' would weigh the classes by this small mix alone (and sklearn
+        # warns about it under warm start), so the new trees get the balanced
+        # weights of every row the model has now been trained on instead
+        seen_labels = labels[np.concatenate([trained_rows, new_rows])]
+        class_counts = np.array([np.sum(seen_labels == label) for label in forest.classes_])
+        class_weights = dict(zip(forest.classes_, len(seen_labels) / (len(forest.classes_) * class_counts)))
+        sample_weight = np.array([class_weights[label] for label in labels[rows]])
+
+        X_fit = model[:-1].transform(pd.DataFrame(store.rows_matrix(rows, columns), columns=columns))
+        class_weight = forest.class_weight
+        forest.set_params(warm_start=True, class_weight=None, n_estimators=forest.n_estimators + trees, n_jobs=n_jobs)
+        forest.fit(X_fit, labels[rows], sample_weight=sample_weight)
+        forest.set_params(warm_start=False, class_weight=class_weight, n_jobs=None)
+
+        version = publish_model(
+            model, kind='incremental', trained=np.concatenate([trained, seqs[new_rows]]),
+            held_out=held_out, imputer_counts=counts
+        )
+        print(f"Model version {version} published ({forest.n_estimators} trees) in {time.perf_counter() - start:.1f}s.")
+        return version
+
+
+def benchmark_model(path=MODEL_PATH, batch_size=256, repeats=50, report_path=BENCHMARK_REPORT_PATH):
+    """
+    Measures what a saved pipeline costs to load and query: joblib load time,
+    size on disk, peak Python memory while loading, and single-row vs batched
+    predict_proba latency. The report is printed and saved as JSON.
+    """
+    import tracemalloc
+
+    X, _, _ = load_training_frame()
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = joblib.load(path)
+    load_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    single_row = X.iloc[[0]]
+    model.predict_proba(single_row)   # Warm-up
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model.predict_proba(single_row)
+        timings.append(time.perf_counter() - t)
+
+    batch = X.iloc[:batch_size]
+    start = time.perf_counter()
+    model.predict_proba(batch)
+    batch_time = time.perf_counter() - start
+
+    report = {
+        'model_path': path,
+        'size_bytes': os.path.getsize(path),
+        'load_seconds': load_time,
+        'load_peak_memory_bytes': peak,
+        'single_row_latency_ms_p50': float(np.median(timings) * 1000),
+        'single_row_latency_ms_p95': float(np.percentile(timings, 95) * 1000),
+        'batch_size': len(batch),
+        'batch_latency_ms': batch_time * 1000,
+        'batch_latency_ms_per_row': batch_time * 1000 / max(1, len(batch)),
+    }
+
+    print(f"\n--- Benchmark: {path} ---")
+    for key, value in report.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    write_json(report_path, report, indent=2)
+    print(f"Report saved to '{report_path}'")
+    return report
+
+def export_compact_model(tolerance=0.02, top_k=None, ccp_alpha=0.0, path=COMPACT_MODEL_PATH,
+                         info_path=COMPACT_INFO_PATH):
+    """
+    Builds a smaller inference model and saves it to `path`: fewer, depth-bounded
+    trees, optionally restricted to the `top_k` most important features of the
+    full model and cost-complexity pruned with `ccp_alpha`. Candidates from
+    COMPACT_CANDIDATES are tried smallest first, and the first one whose test
+    accuracy is within `tolerance` of the full model is kept.
+
+    Both models are scored on the rows the current model version holds out,
+    which no incremental update ever trains on, and the candidates are
+    trained on every other row. The version the compact model was checked
+    against is saved to `info_path`; the registry won't serve it once the
+    full model has moved on to another version.
+    Returns the chosen accuracy, or None if no candidate was close enough.
+    """
+    manifest = load_model_manifest()
+    if not manifest:
+        print("No versioned model yet. Run a full training first.")
+        return None
+    X, y, seqs = load_training_frame()
+    _, held_out = load_row_sets(manifest)
+    test = np.isin(seqs, held_out)
+    X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+
+    full_model = joblib.load(manifest['path'])
+    full_accuracy = accuracy_score(y_test, full_model.predict(X_test))
+    print(f"Full model (version {manifest['version']}) accuracy: {full_accuracy * 100:.2f}%")
+
+    features = list(X.columns)
+    if top_k:
+        importances = full_model.named_steps['classifier'].feature_importances_
+        features = [X.columns[i] for i in np.argsort(importances)[::-1][:top_k]]
+        print(f"Keeping the {len(features)} most important features.")
+
+    for n_estimators, max_depth in COMPACT_CANDIDATES:
+        compact = Pipeline([
+            # Drops every column the compact forest doesn't use, by name
+            ('select', ColumnTransformer([('keep', 'passthrough', features)], remainder='drop')),
+            ('imputer', SimpleImputer(strategy='mean')),
+            ('scaler', StandardScaler()),
+            ('classifier', RandomForestClassifier(
+                n_estimators=n_estimators, max_depth=max_depth, ccp_alpha=ccp_alpha,
+                random_state=42, class_weight='balanced', n_jobs=-1
+            ))
+        ])
+        compact.fit(X_train, y_train)
+        accuracy = accuracy_score(y_test, compact.predict(X_test))
+        print(f"  {n_estimators} trees, depth {max_depth}: {accuracy * 100:.2f}%")
+
+        if accuracy >= full_accuracy - tolerance:
+            compact.named_steps['classifier'].n_jobs = None
+            # sklearn already compares float32 inputs against the split thresholds;
+            # compression is what shrinks the file on disk
+            with atomic_open(path, 'wb') as f:
+                joblib.dump(compact, f, compress=3)
+            write_json(info_path, {'source_version': manifest['version'], 'accuracy': accuracy,
+                                   'full_accuracy': full_accuracy}, indent=2)
+            print(f"Compact model saved to '{path}' ({os.path.getsize(path) / 1e6:.1f} MB)")
+            return accuracy
+
+    print(f"No compact candidate came within {tolerance * 100:.1f} points of the full model.")
+    return None
 
 
 if __name__ == '__main__':
-    train_model()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the playlist classifier.")
+    parser.add_argument('--headless', action='store_true', help="Save the confusion matrix instead of showing it")
+    parser.add_argument('--rebuild-cache', action='store_true', help="Rebuild the cached design matrix")
+    parser.add_argument('--jobs', type=int, default=-1, help="CPU cores for the forest (-1 = all)")
+    parser.add_argument('--benchmark', action='store_true', help="Benchmark the saved model(s) after training")
+    parser.add_argument('--export-compact', action='store_true', help="Also export a compact inference model")
+    parser.add_argument('--tolerance', type=float, default=0.02, help="Max accuracy drop allowed for the compact model")
+    parser.add_argument('--top-k', type=int, default=None, help="Restrict the compact model to the K most important features")
+    parser.add_argument('--skip-training', action='store_true', help="Only benchmark/export the existing model")
+    parser.add_argument('--update', action='store_true', help="Fold new store rows into the current model instead of retraining")
+    parser.add_argument('--update-min-rows', type=int, default=UPDATE_MIN_ROWS, help="New rows required for --update")
+    parser.add_argument('--trees', type=int, default=TREES_PER_UPDATE, help="Trees grown per --update")
+    args = parser.parse_args()
+
+    if args.update:
+        update_model(min_rows=args.update_min_rows, trees=args.trees, n_jobs=args.jobs)
+    elif not args.skip_training:
+        train_model(show_plot=not args.headless, rebuild_cache=args.rebuild_cache, n_jobs=args.jobs)
+    if args.export_compact:
+        export_compact_model(tolerance=args.tolerance, top_k=args.top_k)
+    if args.benchmark:
+        benchmark_model(MODEL_PATH)
+        if os.path.exists(COMPACT_MODEL_PATH):
+            benchmark_model(COMPACT_MODEL_PATH, report_path=BENCHMARK_REPORT_PATH.replace('.json', '_compact.json'))
\ No newline at end of file
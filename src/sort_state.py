@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import threading
+
+from src.atomic_io import write_json
+
+# --- CONFIGURATION ---
+STATE_PATH = os.path.join('data', 'sort_state.json')
+WATCH_INTERVAL = 60        # Seconds between snapshot_id polls of every watched playlist
+
+
+class SortState:
+    """
+    What has already been sorted out of each source playlist: the
+    snapshot_id it had when it was last fully processed and the IDs of every
+    track classified from it. A re-run of an unchanged playlist can stop
+    after one snapshot_id request, and a changed one only needs its new
+    tracks. Also remembers which playlists are being watched.
+
+    Saved as one JSON file, written atomically.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.playlists = {}    # playlist_id -> {'snapshot_id', 'processed': set of track IDs, 'updated'}
+        self.watched = {}      # playlist_id -> {'add_repeats'}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.playlists = {
+                    pid: {**entry, 'processed': set(entry.get('processed', []))}
+                    for pid, entry in data.get('playlists', {}).items()
+                }
+                self.watched = data.get('watched', {})
+            except (OSError, ValueError) as e:
+                print(f"Sort state unreadable, starting empty: {e}")
+
+    def _entry(self, playlist_id):
+        return self.playlists.setdefault(playlist_id, {'snapshot_id': None, 'processed': set(), 'updated': None})
+
+    def snapshot_id(self, playlist_id):
+        with self._lock:
+            return self.playlists.get(playlist_id, {}).get('snapshot_id')
+
+    def processed(self, playlist_id):
+        """Returns a copy of the set of track IDs already sorted out of `playlist_id`."""
+        with self._lock:
+            return set(self.playlists.get(playlist_id, {}).get('processed', ()))
+
+    def mark_processed(self, playlist_id, track_ids):
+        with self._lock:
+            self._entry(playlist_id)['processed'].update(t for t in track_ids if t)
+
+    def mark_complete(self, playlist_id, snapshot_id):
+        """Records that every track of `playlist_id` at `snapshot_id` has been handled."""
+        with self._lock:
+            entry = self._entry(playlist_id)
+            entry['snapshot_id'] = snapshot_id
+            entry['updated'] = time.time()
+
+    def reset(self, playlist_id):
+        """Forgets a playlist's history so its next run sorts every track again."""
+        with self._lock:
+            self.playlists.pop(playlist_id, None)
+
+    def watch(self, playlist_id, add_repeats=False):
+        with self._lock:
+            self.watched[playlist_id] = {'add_repeats': add_repeats}
+        self.save()
+
+    def unwatch(self, playlist_id):
+        with self._lock:
+            removed = self.watched.pop(playlist_id, None) is not None
+        self.save()
+        return removed
+
+    def save(self):
+        with self._lock:
+            data = {
+                'playlists': {
+                    pid: {**entry, 'processed': sorted(entry['processed'])}
+                    for pid, entry in self.playlists.items()
+                },
+                'watched': dict(self.watched),
+            }
+            write_json(self.path, data)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+def get_sort_state():
+    """Returns the shared SortState, loading it from disk on first use."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = SortState()
+        return _state
+
+
+class PlaylistWatcher:
+    """
+    Background poller for the watched playlists. Every `interval` seconds it
+    asks Spotify for each one's snapshot_id (a single tiny request per
+    playlist) and calls `submit(playlist_id, add_repeats)` only for those
+    whose snapshot differs from the one last sorted. The submitted job then
+    sorts just the newly added tracks.
+    """
+
+    def __init__(self, submit, state=None, interval=WATCH_INTERVAL):
+        self.submit = submit
+        self.state = state or get_sort_state()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="playlist-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Checks every watched playlist once; returns the IDs that were submitted."""
+        from src.spotify_client import get_spotify
+        sp = get_spotify()
+        submitted = []
+        for playlist_id, options in list(self.state.watched.items()):
+            try:
+                snapshot_id = sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+            except Exception as e:
+                print(f"[WATCH] Could not check playlist {playlist_id}: {e}")
+                continue
+            if snapshot_id == self.state.snapshot_id(playlist_id):
+                continue
+            print(f"[WATCH] Playlist {playlist_id} changed, sorting its new tracks...")
+            try:
+                self.submit(playlist_id, options.get('add_repeats', False))
+                submitted.append(playlist_id)
+            except Exception as e:
+                print(f"[WATCH] Could not queue playlist {playlist_id}: {e}")
+        return submitted
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from spotipy.oauth2 import SpotifyOAuth
+
+from src.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI
+from src.rate_limit import TokenBucket
+from src import metrics
+
+# --- CONFIGURATION ---
+SCOPE = "playlist-read-private playlist-modify-public playlist-modify-private"
+REQUESTS_TIMEOUT = 30
+POOL_SIZE = 16                 # Keep-alive connections shared by every thread
+MAX_429_RETRIES = 5
+CALLS_PER_SECOND = 10          # Client-side ceiling; halves whenever Spotify answers 429
+PLAYLISTS_TTL = 60             # Seconds the user's playlist listing is reused
+
+# Point the client at a local fake server for tests/benchmarks, e.g.
+# SPOTIFY_API_PREFIX=http://127.0.0.1:8765/v1/ (see benchmarks/fake_spotify.py).
+# A fake server doesn't do OAuth, so SPOTIFY_ACCESS_TOKEN is sent as-is.
+API_PREFIX = os.environ.get('SPOTIFY_API_PREFIX')
+
+
+class RetryingSpotify(spotipy.Spotify):
+    """
+    spotipy client that shares one pooled HTTP session and handles 429s
+    itself: it waits for the Retry-After the server sent (or an exponential
+    backoff if it sent none) and tries again, while the shared token bucket
+    slows every other thread down too.
+    """
+
+    def __init__(self, limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.calls = 0
+
+    def _internal_call(self, method, url, payload, params):
+        for attempt in range(MAX_429_RETRIES + 1):
+            self.limiter.acquire()
+            self.calls += 1
+            metrics.inc('spotify_calls_total', method=method)
+            try:
+                with metrics.timed('spotify_call'):
+                    result = super()._internal_call(method, url, payload, params)
+                self.limiter.reward()
+                return result
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429 or attempt == MAX_429_RETRIES:
+                    raise
+                metrics.inc('spotify_rate_limited_total')
+                retry_after = _retry_after(e)
+                pause = self.limiter.penalize(retry_after)
+                print(f"[SPOTIFY] Rate limited, retrying in {pause:.0f}s")
+
+
+def _retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_spotify():
+    """Returns the process-wide Spotify client (one OAuth token, one connection pool)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # spotipy uses a session we pass in as-is, so this adapter's retry policy
+            # is the only one: transient 5xx errors are retried here, while 429s are
+            # returned untouched so RetryingSpotify sees their Retry-After header.
+            # Only idempotent methods (urllib3's default set) are retried: a POST
+            # such as playlist_add_items may already have been applied when the
+            # 5xx came back, and repeating it would add the tracks twice
+            retry = Retry(
+                total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                respect_retry_after_header=False, raise_on_status=False
+            )
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            kwargs = dict(requests_session=session, requests_timeout=REQUESTS_TIMEOUT)
+            if API_PREFIX:
+                kwargs['auth'] = os.environ.get('SPOTIFY_ACCESS_TOKEN', 'local-test-token')
+            else:
+                kwargs['auth_manager'] = SpotifyOAuth(
+                    client_id=SPOTIPY_CLIENT_ID,
+                    client_secret=SPOTIPY_CLIENT_SECRET,
+                    redirect_uri=SPOTIPY_REDIRECT_URI,
+                    scope=SCOPE
+                )
+
+            _client = RetryingSpotify(TokenBucket(CALLS_PER_SECOND), **kwargs)
+            if API_PREFIX:
+                _client.prefix = API_PREFIX
+        return _client
+
+
+def all_pages(sp, results):
+    """Follows `next` links and returns every item of a paged response."""
+    items = list(results['items'])
+    while results['next']:
+        results = sp.next(results)
+        items.extend(results['items'])
+    return items
+
+
+# --- Response caching ---
+_cache_lock = threading.Lock()
+_playlists = {'expires': 0.0, 'items': None}
+_playlist_items = {}   # (playlist_id, fields) -> (snapshot_id, items)
+
+def get_user_playlists(max_age=PLAYLISTS_TTL):
+    """
+    Returns every playlist of the current user (id, name, total, snapshot_id),
+    reusing the previous listing for `max_age` seconds.
+    """
+    with _cache_lock:
+        if _playlists['items'] is not None and time.monotonic() < _playlists['expires']:
+            return _playlists['items']
+
+    sp = get_spotify()
+    items = [
+        {'id': p['id'], 'name': p['name'], 'total': p['tracks']['total'], 'snapshot_id': p.get('snapshot_id')}
+        for p in all_pages(sp, sp.current_user_playlists()) if p
+    ]
+    with _cache_lock:
+        _playlists.update(items=items, expires=time.monotonic() + max_age)
+    return items
+
+
+def get_playlist_items(playlist_id, snapshot_id=None, fields=None):
+    """
+    Returns every item of a playlist. Results are cached by `snapshot_id`,
+    which Spotify changes on every edit, so a cached copy is never stale.
+    Without a snapshot ID one cheap request fetches the current one first.
+    """
+    sp = get_spotify()
+    if snapshot_id is None:
+        snapshot_id = sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+
+    key = (playlist_id, fields)
+    with _cache_lock:
+        cached = _playlist_items.get(key)
+        if cached and cached[0] == snapshot_id:
+            return cached[1]
+
+    items = all_pages(sp, sp.playlist_items(playlist_id, fields=fields))
+    with _cache_lock:
+        _playlist_items[key] = (snapshot_id, items)
+    return items
+
+
+def invalidate(playlist_id=None):
+    """Drops cached listings after we modify a playlist ourselves."""
+    with _cache_lock:
+        _playlists['items'] = None
+        if playlist_id:
+            for key in [k for k in _playlist_items if k[0] == playlist_id]:
+                del _playlist_items[key]
@@ -0,0 +1,195 @@
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+import numpy as np
+
+from src.feature_store import get_feature_store
+
+# --- CONFIGURATION ---
+MATCH_THRESHOLD = 0.9          # Name matches at or above this confidence skip extraction
+AUDIO_MATCH_THRESHOLD = 0.97   # Audio neighbours at or above this reuse the stored row (skips the AST)
+USE_AUDIO_NEIGHBOURS = True
+AUDIO_DISTANCE_SCALE = 0.5     # RMS z-score distance at which audio confidence reaches 0
+AUDIO_RESCALE_GROWTH = 2.0     # Feature spreads are recomputed once the store has grown by this factor
+
+# Confidence per kind of name match
+CONFIDENCE = {'id': 1.0, 'exact': 1.0, 'normalized': 0.95, 'primary_artist': 0.9}
+
+Match = namedtuple('Match', ['row', 'confidence', 'method'])
+
+# Bracketed or dashed title qualifiers are only dropped when they can't name
+# a different recording: a featured-artist credit, or text made up entirely
+# of the words below ("2011 Remaster", "Deluxe Edition"). Anything mentioning
+# a live, remix, acoustic, instrumental or other version is kept, so those
+# recordings never reuse the studio recording's features.
+_SAME_RECORDING_WORDS = {
+    'remaster', 'remastered', 're', 'master', 'mastered', 'digitally', 'digital',
+    'radio', 'edit', 'explicit', 'clean', 'deluxe', 'bonus', 'track', 'anniversary',
+    'expanded', 'edition', 'special', 'and',
+}
+_DIFFERENT_RECORDING_WORDS = {
+    'live', 'remix', 'remixed', 'mix', 'acoustic', 'instrumental', 'version', 'demo',
+    'rework', 'unplugged', 'session', 'sessions', 'cover', 'karaoke', 'extended', 'dub',
+    'vip', 'orchestral', 'slowed', 'sped', 'reverb', 'bootleg', 'mashup', 'reprise',
+}
+_CREDIT = {'feat', 'ft', 'featuring', 'with'}
+_YEAR_OR_ORDINAL = re.compile(r'^\d+(st|nd|rd|th)?$')
+_BRACKETED = re.compile(r'\s*[\(\[]([^\)\]]*)[\)\]]')
+_DASHED = re.compile(r'\s+-\s+(.*)$')
+_INLINE_FEAT = re.compile(r'\s+((?:feat\.?|ft\.|featuring)\s.*)$', re.IGNORECASE)
+# Only explicit credits split an artist string: "Earth, Wind & Fire" and
+# "Simon & Garfunkel" are one act each (Spotify's first artist is stored as is)
+_ARTIST_SEPARATORS = re.compile(r'\s*(?:;|\bfeat\.|\bfeat\b|\bft\.|\bfeaturing\b)\s*', re.IGNORECASE)
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_SPACES = re.compile(r'\s+')
+
+
+def _fold(text):
+    """Case, accents, compatibility forms, punctuation and spacing all folded away."""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    folded = _PUNCTUATION.sub(' ', stripped.casefold().replace('&', ' and '))
+    return _SPACES.sub(' ', folded).strip()
+
+
+def _same_recording(qualifier):
+    """True if a title qualifier can't denote a different recording (see _SAME_RECORDING_WORDS)."""
+    words = _fold(qualifier).split()
+    if not words or any(w in _DIFFERENT_RECORDING_WORDS for w in words):
+        return False
+    if words[0] in _CREDIT:
+        return True
+    return all(w in _SAME_RECORDING_WORDS or _YEAR_OR_ORDINAL.match(w) for w in words)
+
+
+def normalize_title(title):
+    """
+    "Song - 2011 Remaster", "Song (feat. X)" and "SONG!" all become "song",
+    while "Song - Live from Wembley" or "Song (X Remix)" keep their
+    qualifier. Titles made entirely of qualifiers are left as they are.
+    """
+    title = str(title or '')
+    keep_unless_same = lambda m: '' if _same_recording(m.group(1)) else m.group(0)
+    cleaned = _BRACKETED.sub(keep_unless_same, title)
+    cleaned = _DASHED.sub(keep_unless_same, cleaned)
+    cleaned = _INLINE_FEAT.sub(keep_unless_same, cleaned)
+    return _fold(cleaned) or _fold(title)
+
+
+def normalize_artist(artist):
+    return _fold(artist or '')
+
+
+def primary_artist(artist):
+    """The first credited artist: "A feat. B" and "A; B" give "a", "Simon & Garfunkel" stays whole."""
+    first = _ARTIST_SEPARATORS.split(str(artist or ''), maxsplit=1)[0]
+    return _fold(first) or normalize_artist(artist)
+
+
+class TrackMatcher:
+    """
+    Finds stored feature rows for a track even when its metadata differs.
+
+    Name lookups go exact Spotify ID -> exact artist/title -> normalized
+    artist/title -> primary artist + normalized title, each with a
+    confidence score (see CONFIDENCE). There is deliberately no fuzzy title
+    step: "Part 1" and "Part 2" are as similar as a typo.
+    Separately, match_audio() compares cheap librosa features against every
+    stored row, so identical audio saved under other metadata can reuse its
+    stored AST features. Both indexes follow the store incrementally.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_feature_store()
+        self._lock = threading.Lock()
+        self._indexed = 0
+        self._by_key = {}         # (artist, title) normalized -> row
+        self._by_primary = {}     # (primary artist, title) -> row
+        self._audio_columns = None
+        self._audio = None        # Raw librosa features of every stored row
+        self._audio_rows = 0
+        self._audio_std = None    # Per-feature spread used to scale distances
+        self._std_rows = 0        # Rows the spread was computed from
+
+    # --- Name index ---
+    def _sync_names(self):
+        total = len(self.store)
+        for row in range(self._indexed, total):
+            artist, title = self.store.artists[row], self.store.tracks[row]
+            norm_title = normalize_title(title)
+            self._by_key.setdefault((normalize_artist(artist), norm_title), row)
+            self._by_primary.setdefault((primary_artist(artist), norm_title), row)
+        self._indexed = total
+
+    def match(self, track_id=None, artist=None, title=None):
+        """Returns the best Match for a track, or None if nothing plausible is stored."""
+        row = self.store.find_row(track_id, artist, title)
+        if row is not None:
+            exact_id = bool(track_id) and self.store.track_ids[row] == track_id
+            return Match(row, CONFIDENCE['id' if exact_id else 'exact'], 'id' if exact_id else 'exact')
+
+        with self._lock:
+            self._sync_names()
+            norm_title = normalize_title(title)
+            row = self._by_key.get((normalize_artist(artist), norm_title))
+            if row is not None:
+                return Match(row, CONFIDENCE['normalized'], 'normalized')
+            row = self._by_primary.get((primary_artist(artist), norm_title))
+            if row is not None:
+                return Match(row, CONFIDENCE['primary_artist'], 'primary_artist')
+            return None
+
+    # --- Audio neighbour index ---
+    def _sync_audio(self, columns):
+        if self._audio_columns != columns:
+            self._audio_columns, self._audio, self._audio_rows = columns, np.empty((0, len(columns)), dtype=np.float32), 0
+            self._audio_std, self._std_rows = None, 0
+
+        total = len(self.store)
+        if self._audio_rows < total:
+            new = self.store.rows_matrix(range(self._audio_rows, total), columns)
+            self._audio = np.vstack([self._audio, new])
+            self._audio_rows = total
+
+        # Scale each feature by its spread so tempo (~120) doesn't drown the MFCC
+        # stds. The spread of the first few rows says little about the rest, so
+        # it is recomputed over every row whenever the store has grown enough;
+        # the raw rows are kept, so nothing needs rescaling
+        if self._audio_std is None or total >= self._std_rows * AUDIO_RESCALE_GROWTH:
+            with np.errstate(all='ignore'):
+                std = np.nan_to_num(np.nanstd(self._audio, axis=0)) if total else np.ones(len(columns))
+            self._audio_std = np.where(std > 0, std, 1.0).astype(np.float32)
+            self._std_rows = total
+
+    def match_audio(self, librosa_features):
+        """
+        Returns a Match for the stored row whose librosa features are closest
+        to `librosa_features`, or None. Confidence falls linearly from 1 at
+        identical features to 0 at AUDIO_DISTANCE_SCALE.
+        """
+        columns = sorted(c for c in librosa_features if c in self.store.columns)
+        if not columns:
+            return None
+        with self._lock:
+            self._sync_audio(columns)
+            if not len(self._audio):
+                return None
+            query = np.array([librosa_features[c] for c in columns], dtype=np.float32)
+            # Missing stored values count as far away rather than as a match
+            distances = np.sqrt(np.mean(np.nan_to_num(((self._audio - query) / self._audio_std) ** 2, nan=1e6), axis=1))
+            row = int(np.argmin(distances))
+            confidence = max(0.0, 1.0 - float(distances[row]) / AUDIO_DISTANCE_SCALE)
+        return Match(row, confidence, 'audio') if confidence > 0 else None
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_track_matcher():
+    """Returns the shared TrackMatcher over the shared feature store."""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = TrackMatcher()
+        return _matcher
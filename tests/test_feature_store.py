@@ -0,0 +1,106 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_store import FeatureStore, MERGE_FACTOR
+
+
+def _row(name, label='room', **features):
+    return {'artist': 'Artist', 'track': name, 'label': label, 'track_id': None, **features}
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / 'store')
+
+
+def _segments(root):
+    return glob.glob(os.path.join(root, 'seg-*.npz'))
+
+
+def test_append_and_reload_keep_rows_and_columns(root):
+    store = FeatureStore(root)
+    store.append([_row('one', tempo=120.0), _row('two', tempo=90.0)])
+    store.append([_row('three', label='edm-club', energy=0.5)])
+
+    reloaded = FeatureStore(root)
+    assert reloaded.tracks == ['one', 'two', 'three']
+    assert reloaded.columns == ['tempo', 'energy']
+    assert reloaded.find_row(artist='Artist', track='three') == 2
+    assert reloaded.row_features(2)['energy'] == 0.5
+    assert np.isnan(reloaded.row_features(2)['tempo'])
+    assert reloaded.seqs == store.seqs
+
+
+def test_skip_existing_drops_stored_and_repeated_rows(root):
+    store = FeatureStore(root)
+    store.append([_row('one', tempo=1.0)])
+    added = store.append([_row('one', tempo=2.0), _row('two', tempo=3.0), _row('two', tempo=4.0)], skip_existing=True)
+    assert added == 1
+    assert store.tracks == ['one', 'two']
+
+
+def test_merge_keeps_row_numbers_and_values(root):
+    store = FeatureStore(root)
+    for i in range(MERGE_FACTOR * 3):
+        store.append([_row(f'song {i}', tempo=float(i))])
+    before = store.matrix(['tempo'])[:, 0]
+
+    assert len(_segments(root)) < MERGE_FACTOR * 3
+    np.testing.assert_array_equal(before, np.arange(MERGE_FACTOR * 3, dtype=np.float32))
+    reloaded = FeatureStore(root)
+    assert reloaded.tracks == store.tracks
+    np.testing.assert_array_equal(reloaded.matrix(['tempo'])[:, 0], before)
+
+    reloaded.compact()
+    assert len(_segments(root)) == 1
+    np.testing.assert_array_equal(FeatureStore(root).matrix(['tempo'])[:, 0], before)
+
+
+def test_interleaved_appends_from_two_stores_reload_in_append_order(root):
+    a, b = FeatureStore(root), FeatureStore(root)
+    a.append([_row('a0', tempo=0.0)])
+    b.append([_row('b0', tempo=100.0)])
+    # Enough appends for `a` to merge its own segments, b0 in between them
+    for i in range(1, MERGE_FACTOR):
+        a.append([_row(f'a{i}', tempo=float(i))])
+    assert len(_segments(root)) < MERGE_FACTOR + 1
+
+    reloaded = FeatureStore(root)
+    assert reloaded.tracks == ['a0', 'b0'] + [f'a{i}' for i in range(1, MERGE_FACTOR)]
+    assert reloaded.row_features(1)['tempo'] == 100.0
+    assert sorted(reloaded.seqs) == reloaded.seqs
+
+    # Merging the reloaded, interleaved view keeps the order too
+    reloaded.compact()
+    assert FeatureStore(root).tracks == reloaded.tracks
+
+
+def test_migration_resumes_after_the_last_finished_chunk(root, tmp_path, monkeypatch):
+    import src.feature_store as feature_store
+    csv_path = tmp_path / 'legacy.csv'
+    csv_path.write_text('tempo,artist,track,label\n' + ''.join(f'{i},Artist,song {i},room\n' for i in range(5)),
+                        encoding='utf-8')
+    monkeypatch.setattr(feature_store, 'MIGRATION_CHUNK_ROWS', 2)
+
+    store = FeatureStore(root)
+    store._save_migration_state(1, False)
+    assert store.migrate_csv(str(csv_path)) == 3
+    assert store.migration_state() == {'chunks': 3, 'done': True}
+    assert FeatureStore(root).tracks == ['song 2', 'song 3', 'song 4']
+
+
+def test_export_csv_writes_every_row_in_chunks(root, tmp_path):
+    store = FeatureStore(root)
+    store.append([_row(f'song {i}', tempo=float(i)) for i in range(5)])
+    store.append([_row('other', energy=0.5)])
+
+    path = str(tmp_path / 'export.csv')
+    assert store.export_csv(path, chunk_rows=2) == 6
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    assert list(df.columns) == ['tempo', 'energy', 'artist', 'track', 'label', 'track_id']
+    assert df['track'].tolist() == store.tracks
+    assert df['energy'].iloc[5] == 0.5
@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+
+import pytest
+
+from src.pipeline import Stage, run_pipeline
+
+
+def _jittered(fn):
+    def wrapped(x):
+        time.sleep(random.random() * 0.005)
+        return fn(x)
+    return wrapped
+
+
+def _wait_for_threads(baseline, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > baseline and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return threading.active_count()
+
+
+def test_ordered_results_follow_input_order():
+    stages = [Stage('double', _jittered(lambda x: x * 2), workers=4), Stage('inc', _jittered(lambda x: x + 1), workers=3)]
+    seen = []
+    results = run_pipeline(range(50), stages, queue_size=2, on_result=lambda item, value: seen.append(item))
+    assert seen == list(range(50))
+    assert results == [(i, i * 2 + 1) for i in range(50)]
+
+
+def test_batched_stage_and_dropped_items():
+    stages = [
+        Stage('odd only', lambda x: x if x % 2 else None, workers=2),
+        Stage('batch', lambda xs: [x * 10 for x in xs], workers=2, batch_size=4, batch_wait=0.01),
+    ]
+    results = run_pipeline(range(20), stages, ordered=False)
+    assert sorted(results) == [(i, i * 10) for i in range(1, 20, 2)]
+
+
+def test_failing_stage_drops_only_that_item(capsys):
+    def fn(x):
+        if x == 3:
+            raise ValueError('boom')
+        return x
+    results = run_pipeline(range(6), [Stage('maybe', fn, workers=2)])
+    assert [item for item, _ in results] == [0, 1, 2, 4, 5]
+    assert "Stage 'maybe' failed" in capsys.readouterr().out
+
+
+def test_should_stop_stops_feeding_and_processing():
+    processed = []
+    stop = threading.Event()
+
+    def fn(x):
+        processed.append(x)
+        if len(processed) == 5:
+            stop.set()
+        return x
+    results = run_pipeline(range(1000), [Stage('s', fn)], queue_size=4, should_stop=stop.is_set)
+    assert len(results) < 20
+    assert len(processed) < 20
+
+
+def test_on_result_raising_leaves_no_blocked_threads():
+    baseline = threading.active_count()
+
+    def on_result(item, value):
+        raise RuntimeError('callback failed')
+
+    stages = [Stage('a', lambda x: x, workers=3), Stage('b', lambda x: x, workers=2)]
+    with pytest.raises(RuntimeError):
+        run_pipeline(range(500), stages, queue_size=1, on_result=on_result)
+    assert _wait_for_threads(baseline) == baseline
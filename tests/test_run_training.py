@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+from src import run_training
+from src.feature_store import FeatureStore
+
+LABELS = ['citypop', 'edm-club', 'room']
+
+
+def _rows(prefix, count, rng):
+    return [
+        {'tempo': 80.0 + 30 * (i % 3) + rng.normal(), 'energy': (i % 3) / 3 + rng.normal(scale=0.05),
+         'artist': 'Artist', 'track': f'{prefix} {i}', 'label': LABELS[i % 3], 'track_id': None}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    models = tmp_path / 'models'
+    monkeypatch.setattr(run_training, 'DESIGN_DIR', str(tmp_path / 'design_matrix'))
+    monkeypatch.setattr(run_training, 'MODEL_PATH', str(models / 'song_classifier.joblib'))
+    monkeypatch.setattr(run_training, 'VERSIONS_DIR', str(models / 'versions'))
+    monkeypatch.setattr(run_training, 'MODEL_MANIFEST_PATH', str(models / 'model_manifest.json'))
+    monkeypatch.setattr(run_training, 'plot_confusion_matrix', lambda *args, **kwargs: None)
+
+    store = FeatureStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(run_training, 'get_feature_store', lambda: store)
+    store.append(_rows('base', 60, np.random.default_rng(0)))
+    run_training.train_model(show_plot=False, n_jobs=1)
+    return store
+
+
+def test_update_folds_in_rows_appended_by_another_process(store, recwarn):
+    # Written through a second instance: the shared store never sees these rows
+    FeatureStore(store.root).append(_rows('new', 30, np.random.default_rng(1)))
+    assert len(store) == 60
+
+    before = run_training.load_model_manifest()
+    assert run_training.update_model(min_rows=10, trees=5, n_jobs=1) == 2
+
+    manifest = run_training.load_model_manifest()
+    trained, held_out = run_training.load_row_sets(manifest)
+    old_trained, old_held_out = run_training.load_row_sets(before)
+    assert manifest['trained_rows'] == before['trained_rows'] + 30
+    np.testing.assert_array_equal(held_out, old_held_out)
+    assert not set(held_out) & set(trained)
+    assert set(old_trained) < set(trained)
+    assert not [w for w in recwarn if 'class_weight' in str(w.message)]
+
+
+def test_update_skips_when_nothing_new(store):
+    assert run_training.update_model(min_rows=1, n_jobs=1) is None
+
+    FeatureStore(store.root).append(_rows('new', 30, np.random.default_rng(1)))
+    assert run_training.update_model(min_rows=10, trees=5, n_jobs=1) == 2
+    # The same rows aren't counted as new a second time
+    assert run_training.update_model(min_rows=1, n_jobs=1) is None
+
+
+def test_compact_model_is_refused_after_an_update(store, tmp_path, monkeypatch):
+    from src import model_registry
+    models = tmp_path / 'models'
+    compact, info = str(models / 'compact.joblib'), str(models / 'compact.json')
+    monkeypatch.setattr(model_registry, 'USE_COMPACT_CLASSIFIER', True)
+    monkeypatch.setattr(model_registry, 'CLASSIFIER_PATH', run_training.MODEL_PATH)
+    monkeypatch.setattr(model_registry, 'COMPACT_CLASSIFIER_PATH', compact)
+    monkeypatch.setattr(model_registry, 'COMPACT_INFO_PATH', info)
+    monkeypatch.setattr(model_registry, 'MODEL_MANIFEST_PATH', run_training.MODEL_MANIFEST_PATH)
+
+    assert run_training.export_compact_model(tolerance=1.0, path=compact, info_path=info) is not None
+    assert model_registry.classifier_path() == compact
+
+    FeatureStore(store.root).append(_rows('new', 30, np.random.default_rng(1)))
+    assert run_training.update_model(min_rows=10, trees=5, n_jobs=1) == 2
+    assert model_registry.classifier_path() == run_training.MODEL_PATH
@@ -0,0 +1,82 @@
+import pytest
+
+from src.feature_store import FeatureStore
+from src.track_matching import TrackMatcher, MATCH_THRESHOLD, normalize_title, primary_artist
+
+
+@pytest.mark.parametrize('title', [
+    "Song - Live from Wembley",
+    "Song - Clean Bandit Remix",
+    "Song - Mono Remix",
+    "Song (Acoustic)",
+    "Song - Instrumental",
+    "Song - Single Version",
+    "Song (feat. X) [Live]",
+])
+def test_other_recordings_keep_their_qualifier(title):
+    assert normalize_title(title) != 'song'
+
+
+def test_live_qualifier_with_same_recording_words_is_kept():
+    assert normalize_title("Wake Me Up (Live from Tomorrowland)") == 'wake me up live from tomorrowland'
+
+
+@pytest.mark.parametrize('title', [
+    "Song - 2011 Remaster",
+    "Song (Remastered 2009)",
+    "Song (feat. Drake)",
+    "Song feat. X",
+    "Song (with Calvin Harris)",
+    "Song [Deluxe Edition]",
+    "Song (25th Anniversary Edition)",
+    "SONG!",
+])
+def test_same_recording_qualifiers_are_dropped(title):
+    assert normalize_title(title) == 'song'
+
+
+@pytest.mark.parametrize('artist, expected', [
+    ("Earth, Wind & Fire", 'earth wind and fire'),
+    ("Simon & Garfunkel", 'simon and garfunkel'),
+    ("Tyler, The Creator", 'tyler the creator'),
+    ("Lil Nas X", 'lil nas x'),
+    ("Drake feat. Rihanna", 'drake'),
+    ("A ft. B", 'a'),
+])
+def test_primary_artist_only_splits_on_credits(artist, expected):
+    assert primary_artist(artist) == expected
+
+
+@pytest.fixture
+def matcher(tmp_path):
+    store = FeatureStore(str(tmp_path / 'store'))
+    store.append([
+        {'tempo': 120.0, 'artist': 'Avicii', 'track': 'Wake Me Up', 'label': 'edm-club', 'track_id': 'a' * 22},
+        {'tempo': 90.0, 'artist': 'Simon & Garfunkel', 'track': 'The Boxer', 'label': 'room', 'track_id': 'b' * 22},
+    ])
+    return TrackMatcher(store)
+
+
+def test_live_recording_does_not_reuse_studio_features(matcher):
+    assert matcher.match(None, 'Avicii', 'Wake Me Up (Live from Tomorrowland)') is None
+
+
+def test_remaster_matches_confidently(matcher):
+    match = matcher.match(None, 'Avicii', 'Wake Me Up - 2013 Remaster')
+    assert match.row == 0 and match.confidence >= MATCH_THRESHOLD
+
+
+def test_acts_sharing_a_first_word_do_not_match(matcher):
+    assert matcher.match(None, 'Simon', 'The Boxer') is None
+
+
+def test_audio_spread_is_recomputed_as_the_store_grows(matcher):
+    before = matcher.match_audio({'tempo': 121.0})
+    assert before.row == 0
+    matcher.store.append([
+        {'tempo': float(t), 'artist': f'Artist {t}', 'track': 'Song', 'label': 'room', 'track_id': None}
+        for t in range(0, 300, 100)
+    ])
+    after = matcher.match_audio({'tempo': 121.0})
+    # A wider spread puts the same tempo gap closer to a match
+    assert after.row == 0 and after.confidence > before.confidence